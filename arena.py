@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+"""
+Flat representation of a parsed program. Instead of a Node object
+per syntax element the arena keeps a few arrays indexed by node id:
+
+  kind[i]   index of the node class in arena.kinds
+  line[i]   source line, 0 if unknown
+  first[i]  nodes: offset of the first child id in arena.children,
+            leaves: index of the value in arena.consts
+  count[i]  number of children, 0 for leaves
+
+Children are added before their parents, so an arena is built in
+one post-order pass and rewrite() can build a new one on the fly.
+Cursor gives a Node-like view of one element.
+
+  arena = Arena.from_tree(parse(indent_parse(tokenize(src))))
+  data = arena.dumps()
+  run(Arena.loads(data).to_tree(astMap))
+"""
+
+from ast import Node, Leaf, postorder
+from array import array
+import importlib
+import json
+import sys
+
+MAGIC = b"DSA1"
+
+
+class Cursor:
+  """ A node or a leaf of an arena. """
+  __slots__ = ('arena', 'id')
+
+  def __init__(self, arena, id):
+    self.arena = arena
+    self.id = id
+
+  @property
+  def kind(self):
+    """ Class of the element, e.g. ast.Add. """
+    return self.arena.kinds[self.arena.kind[self.id]]
+
+  @property
+  def is_leaf(self):
+    return self.arena.is_leaf(self.id)
+
+  @property
+  def value(self):
+    if not self.is_leaf:
+      raise AttributeError("%s has no value" % self.kind.__name__)
+    return self.arena.consts[self.arena.first[self.id]]
+
+  @property
+  def lineno(self):
+    return self.arena.line[self.id] or None
+
+  def __len__(self):
+    return self.arena.count[self.id]
+
+  def __getitem__(self, i):
+    n = self.arena.count[self.id]
+    if i < 0:
+      i += n
+    if not 0 <= i < n:
+      raise IndexError(i)
+    return Cursor(self.arena, self.arena.children[self.arena.first[self.id] + i])
+
+  def __iter__(self):
+    arena = self.arena
+    start = arena.first[self.id]
+    for c in arena.children[start:start + arena.count[self.id]]:
+      yield Cursor(arena, c)
+
+  def __getattr__(self, name):
+    fields = getattr(self.kind, 'fields', None)
+    if not fields or name not in fields:
+      raise AttributeError("Unknown attribute \"%s\" for %s" % (name, self.kind.__name__))
+    return self[fields.index(name)]
+
+  def __eq__(self, other):
+    return isinstance(other, Cursor) and self.arena is other.arena and self.id == other.id
+
+  def __hash__(self):
+    return hash((id(self.arena), self.id))
+
+  def __repr__(self):
+    if self.is_leaf:
+      return "%s(%s)" % (self.kind.__name__, self.value)
+    return "%s(%s)" % (self.kind.__name__, ", ".join(map(repr, self)))
+
+
+class Arena:
+  def __init__(self):
+    self.kinds = []      # node classes
+    self.kind_ids = {}   # class -> index in kinds
+    self.consts = []     # values of leaves
+    self.const_ids = {}  # value -> index in consts
+    self.kind = array('H')
+    self.line = array('I')
+    self.first = array('I')
+    self.count = array('I')
+    self.children = array('I')
+    self.root = None
+
+  def __len__(self):
+    return len(self.kind)
+
+  @classmethod
+  def from_tree(cls, tree):
+    arena = cls()
+    arena.root = arena.add(tree)
+    return arena
+
+  @property
+  def top(self):
+    return Cursor(self, self.root)
+
+  def is_leaf(self, id):
+    return not issubclass(self.kinds[self.kind[id]], Node)
+
+  def kind_id(self, kind):
+    try:
+      return self.kind_ids[kind]
+    except KeyError:
+      self.kind_ids[kind] = len(self.kinds)
+      self.kinds.append(kind)
+      return self.kind_ids[kind]
+
+  def const_id(self, value):
+    key = (type(value), value)
+    try:
+      return self.const_ids[key]
+    except KeyError:
+      self.const_ids[key] = len(self.consts)
+      self.consts.append(value)
+      return self.const_ids[key]
+
+  def add_leaf(self, kind, value, lineno=None):
+    self.kind.append(self.kind_id(kind))
+    self.line.append(lineno or 0)
+    self.first.append(self.const_id(value))
+    self.count.append(0)
+    return len(self.kind) - 1
+
+  def add_node(self, kind, children, lineno=None):
+    """ Adds a node, children are ids of elements already in the arena. """
+    self.kind.append(self.kind_id(kind))
+    self.line.append(lineno or 0)
+    self.first.append(len(self.children))
+    self.count.append(len(children))
+    self.children.extend(children)
+    return len(self.kind) - 1
+
+  def add(self, tree):
+    """ Adds a tree of Nodes and Leaves and returns the id of its root.
+        The tree may contain cursors: cursors of this arena are
+        referenced, cursors of other arenas are copied.
+    """
+    ids = []
+    for e in postorder(tree):
+      if isinstance(e, Cursor):
+        ids.append(e.id if e.arena is self else self.copy(e))
+      elif isinstance(e, Node):
+        n = len(e)
+        children = ids[len(ids)-n:]
+        del ids[len(ids)-n:]
+        ids.append(self.add_node(type(e), children, e.lineno))
+      else:
+        ids.append(self.add_leaf(type(e), e.value, e.lineno))
+    return ids[0]
+
+  def copy(self, cursor):
+    """ Copies a subtree of another arena into this one. """
+    src = cursor.arena
+    ids = []
+    for c in postorder_ids(src, cursor.id):
+      kind, line = src.kinds[src.kind[c]], src.line[c]
+      if src.is_leaf(c):
+        ids.append(self.add_leaf(kind, src.consts[src.first[c]], line))
+      else:
+        n = src.count[c]
+        children = ids[len(ids)-n:]
+        del ids[len(ids)-n:]
+        ids.append(self.add_node(kind, children, line))
+    return ids[0]
+
+  def compact(self):
+    """ A copy without elements unreachable from the root. """
+    arena = Arena()
+    arena.root = arena.copy(self.top)
+    return arena
+
+  def to_tree(self, classes=None):
+    """ Builds Node objects. With classes, an ordered mapping of
+        parser classes to interpreter ones like interpreter.astMap,
+        the elements are replaced as interpreter.translate() does.
+    """
+    make = {}  # kind index -> constructor
+    for i, kind in enumerate(self.kinds):
+      new = None
+      for old, cls in (classes or {}).items():
+        if issubclass(kind, old):
+          new = cls
+          break
+      if new:
+        make[i] = (lambda cls: lambda args: cls(*args))(new)
+      elif issubclass(kind, Node):
+        make[i] = (lambda cls: lambda args: raw_node(cls, args))(kind)
+      else:
+        make[i] = (lambda cls: lambda args: raw_leaf(cls, args[0]))(kind)
+
+    built = []
+    for c in postorder_ids(self, self.root):
+      if self.is_leaf(c):
+        e = make[self.kind[c]]((self.consts[self.first[c]],))
+      else:
+        n = self.count[c]
+        e = make[self.kind[c]](built[len(built)-n:])
+        del built[len(built)-n:]
+      e.lineno = self.line[c] or None
+      built.append(e)
+    return built[0]
+
+  ###########
+  # STORAGE #
+  ###########
+
+  def nbytes(self):
+    """ Memory used by the arrays and the constant pool. """
+    size = sum(a.itemsize * len(a) for a in self.arrays())
+    return size + sum(sys.getsizeof(v) for v in self.consts)
+
+  def arrays(self):
+    return (self.kind, self.line, self.first, self.count, self.children)
+
+  def dumps(self):
+    header = json.dumps({
+      'kinds': ["%s.%s" % (k.__module__, k.__qualname__) for k in self.kinds],
+      'consts': self.consts,
+      'sizes': [len(a) for a in self.arrays()],
+      'root': self.root,
+      'byteorder': sys.byteorder,
+    }).encode()
+    return b"".join([MAGIC, len(header).to_bytes(4, 'little'), header]
+                    + [a.tobytes() for a in self.arrays()])
+
+  @classmethod
+  def loads(cls, data):
+    if data[:4] != MAGIC:
+      raise ValueError("not a serialized arena")
+    hlen = int.from_bytes(data[4:8], 'little')
+    header = json.loads(data[8:8+hlen])
+    arena = cls()
+    for name in header['kinds']:
+      module, _, qualname = name.rpartition('.')
+      arena.kind_id(getattr(importlib.import_module(module), qualname))
+    for v in header['consts']:
+      arena.const_id(v)
+    pos = 8 + hlen
+    for a, n in zip(arena.arrays(), header['sizes']):
+      a.frombytes(data[pos:pos + n*a.itemsize])
+      pos += n*a.itemsize
+      if header['byteorder'] != sys.byteorder:
+        a.byteswap()
+    arena.root = header['root']
+    return arena
+
+
+def raw_node(cls, children):
+  """ Node without running its __init__, e.g., Comma would regroup children. """
+  node = cls.__new__(cls)
+  list.__init__(node, children)
+  return node
+
+
+def raw_leaf(cls, value):
+  leaf = cls.__new__(cls)
+  leaf.value = value
+  return leaf
+
+
+def postorder_ids(arena, root):
+  """ Yields ids of the subtree, children before parents. """
+  stack = [(root, False)]
+  first, count, children = arena.first, arena.count, arena.children
+  while stack:
+    c, expanded = stack.pop()
+    if expanded or not count[c]:
+      yield c
+      continue
+    stack.append((c, True))
+    start = first[c]
+    stack.extend((k, False) for k in reversed(children[start:start+count[c]]))
+
+
+def walk(arena):
+  """ Yields cursors of all elements in pre-order. """
+  stack = [arena.root]
+  first, count, children = arena.first, arena.count, arena.children
+  while stack:
+    c = stack.pop()
+    yield Cursor(arena, c)
+    start = first[c]
+    stack.extend(reversed(children[start:start+count[c]]))
+
+
+def rewrite(arena, f):
+  """ Applies f(cursor, depth) to all elements, children before
+      parents, and returns a new arena. The cursor points to the
+      element in the new arena, with its children already rewritten.
+      f returns the cursor to keep the element or a tree of Nodes
+      and Leaves to replace it (the tree can contain cursors).
+      Unlike ast.rewrite, the root is visited only once, last.
+  """
+  new = Arena()
+  ids = []
+  stack = [(arena.root, 0, False)]
+  while stack:
+    c, depth, expanded = stack.pop()
+    kind, line = arena.kinds[arena.kind[c]], arena.line[c]
+    if arena.is_leaf(c):
+      id = new.add_leaf(kind, arena.consts[arena.first[c]], line)
+    elif not expanded:
+      stack.append((c, depth, True))
+      start = arena.first[c]
+      stack.extend((k, depth+1, False)
+                   for k in reversed(arena.children[start:start+arena.count[c]]))
+      continue
+    else:
+      n = arena.count[c]
+      children = ids[len(ids)-n:]
+      del ids[len(ids)-n:]
+      id = new.add_node(kind, children, line)
+    result = f(Cursor(new, id), max(depth-1, 0))  # depth of the parent, as in ast.rewrite
+    ids.append(result.id if isinstance(result, Cursor) and result.arena is new else new.add(result))
+  new.root = ids[0]
+  return new
+
+
+def pretty_print(arena, lvl=0):
+  """ Same output as ast.pretty_print() of the tree. """
+  stack = [(c, lvl) for c in reversed(list(arena.top))]
+  while stack:
+    c, l = stack.pop()
+    prefix = " "*l
+    if c.is_leaf:
+      print(prefix, raw_leaf(c.kind, c.value))
+    else:
+      print(prefix, c.kind.__name__)
+      stack.extend((n, l+1) for n in reversed(list(c)))
+  if lvl == 0:
+    print()
+
+
+def tree_bytes(tree):
+  """ Memory used by a tree of Nodes and Leaves (without classes). """
+  size = 0
+  for e in postorder(tree):
+    size += sys.getsizeof(e)
+    if hasattr(e, '__dict__'):
+      size += sys.getsizeof(e.__dict__)
+      if isinstance(e, Leaf):
+        size += sys.getsizeof(e.value)
+  return size
+
+
+if __name__ == '__main__':
+  from log import logfilter
+  from tokenizer import tokenize
+  from indent import parse as indent_parse
+  from ast import parse
+  logfilter.default = False
+  tree = parse(indent_parse(tokenize(open(sys.argv[1]).read())))
+  nodes = sum(1 for _ in postorder(tree))
+  before = tree_bytes(tree)
+  arena = Arena.from_tree(tree)
+  pretty_print(arena)
+  print("%d elements: tree %d bytes (%.1f per element), arena %d bytes (%.1f per element), serialized %d bytes"
+        % (nodes, before, before/nodes, arena.nbytes(), arena.nbytes()/nodes, len(arena.dumps())))
@@ -2,6 +2,8 @@
 
 from pratt import prefix, infix, infix_r, postfix, brackets, \
   subscript, nullary, ifelse, symap, parse as pratt_parse, expr
+from timings import phase
+from functools import lru_cache
 from log import Log
 log = Log('ast')
 
@@ -23,6 +25,7 @@ class Node(list):
   of attributes to be specified in class.fields.
   """
   fields = []
+  lineno = None
 
   def __init__(self, *args):
     if self.fields and len(args) != len(self.fields):
@@ -36,10 +39,10 @@ class Node(list):
     return self[idx]
 
   def __setattr__(self, name, value):
-    if name in self.fields:
+    if self.fields and name in self.fields:
       idx = self.fields.index(name)
       self[idx] = value
-    elif name in dir(self.__class__):
+    elif hasattr(self.__class__, name):
       super().__setattr__(name, value)
     else:
       raise AttributeError("Unknown attribute \"%s\" for %s (%s)" % (name, type(self), self.fields))
@@ -52,28 +55,27 @@ class Node(list):
       return super().__dir__()
 
   def __repr__(self):
+    return node_repr(self)
+
+  def repr_items(self):
+    """ Name shown by repr() and (field name or None, child) pairs. """
     cls = self.__class__.__name__
     if self.fields:
-      args = ", ".join("%s=%s"%(name, getattr(self,name)) for name in self.fields)
-    else:
-      args = ", ".join(map(str, self))
-    return "%s(%s)" % (cls, args)
+      return cls, [(name, getattr(self, name)) for name in self.fields]
+    return cls, [(None, child) for child in self]
 
 
 class ListNode(Node):
   """ Represents a node that is just a list of something. """
   fields = None
 
-  def __repr__(self):
-    cls = self.__class__.__name__
-    return "%s(%s)" % (cls, ", ".join(map(str,self)))
-
 
 class Leaf:
   """ Base class for AST elements that do not support
       iteration over them.
   """
   lbp = 0
+  lineno = None
   def __init__(self, value=None):
     assert not hasattr(self, 'fields'), \
       "Leaf subclass cannot have fields attribute (it's not a Node)"
@@ -100,8 +102,8 @@ class Binary(Node):
 
 class Expr(Node):
   """ Base class for expressions. """
-  def __repr__(self):
-    return "Expr(%s)" % ", ".join(str(s) for s in self)
+  def repr_items(self):
+    return "Expr", [(None, child) for child in self]
 
 
 class Block(Node):
@@ -196,6 +198,9 @@ class Less(Binary): pass
 @infix('>', 10)
 class More(Binary): pass
 
+@infix('..', 15)
+class Range(Binary): pass
+
 @infix('+', 20)
 class Add(Binary): pass
 
@@ -245,17 +250,90 @@ class IfElse(Node):
 #######################
 
 def rewrite(tree, f, d=0, **kwargs):
-  """ Generic function to transform AST. It reqursively
-      applies function to all elements of the tree.
+  """ Generic function to transform AST. It applies function
+      to all elements of the tree, children before parents.
+      Uses an explicit stack, so the depth of the tree is
+      not limited by the recursion limit.
   """
   if d==0: tree = f(tree, d, **kwargs)  # TODO: is this a dirty hack?
-  for i,n in enumerate(tree):
+  stack = [[tree, 0, d]]  # node, index of the next child, depth
+  while stack:
+    top = stack[-1]
+    node, i, depth = top
+    if i < len(node):
+      n = node[i]
       if isinstance(n, Node):
-        n = rewrite(n, f, d+1, **kwargs)
-      tree[i] = f(n, d, **kwargs)
+        stack.append([n, 0, depth+1])
+        continue
+      node[i] = f(n, depth, **kwargs)
+      top[1] = i+1
+      continue
+    stack.pop()
+    if stack:  # the subtree is done, replace it in the parent
+      parent = stack[-1]
+      parent[0][parent[1]] = f(node, parent[2], **kwargs)
+      parent[1] += 1
   return tree
 
 
+@lru_cache(maxsize=None)
+def expands(cls):
+  """ True if node_repr() shows children of the instances. """
+  return issubclass(cls, Node) and cls.__repr__ is Node.__repr__ \
+    and cls.__str__ is object.__str__
+
+
+def node_repr(tree):
+  """ repr() of a node, nested nodes are expanded with an explicit
+      stack (repr of the tree is used as a key, e.g., by the match
+      dispatch and the type checker). Nodes with their own __str__
+      and leaves are shown with str().
+  """
+  out = []
+  stack = [(False, tree)]  # (is text, text or node)
+  while stack:
+    text, x = stack.pop()
+    if text:
+      out.append(x)
+    elif expands(type(x)):
+      name, items = x.repr_items()
+      stack.append((True, ")"))
+      for i in reversed(range(len(items))):
+        field, child = items[i]
+        stack.append((False, child))
+        prefix = ", " if i else ""
+        if field:
+          prefix += field + "="
+        if prefix:
+          stack.append((True, prefix))
+      stack.append((True, name + "("))
+    else:
+      out.append(str(x))
+  return "".join(out)
+
+
+def walk(tree):
+  """ Yields all nodes and leaves of the tree in pre-order. """
+  stack = [tree]
+  while stack:
+    node = stack.pop()
+    yield node
+    if isinstance(node, Node):
+      stack.extend(reversed(node))
+
+
+def postorder(tree):
+  """ Yields all nodes and leaves of the tree, children before parents. """
+  stack = [(tree, False)]
+  while stack:
+    node, expanded = stack.pop()
+    if expanded or not isinstance(node, Node):
+      yield node
+      continue
+    stack.append((node, True))
+    stack.extend((n, False) for n in reversed(node))
+
+
 @rewrites
 def implicit_calls(expr, depth):
   """ Adds "implicit" calls. E.g., expression "a b c" will
@@ -270,7 +348,7 @@ def implicit_calls(expr, depth):
   prev, nxt = None, None
   for i,nxt in enumerate(expr):
     if isinstance(prev, Id) and \
-    (isinstance(nxt, (Int,Id)) or nxt.sym =='('):
+    (isinstance(nxt, (Int,Str,ShellCmd,Id)) or getattr(nxt, 'sym', None) =='('):
       result.append(symap['@']())
     result.append(nxt)
     prev = nxt
@@ -297,8 +375,11 @@ def func_args(func, depth):
     "function argument can be a single ID or some IDs separated by commas"
   if isinstance(args, Id):
     args = [args]
-  args = ListNode(*[Id(name.value) for name in args])
-  func.args = args
+  ids = []
+  for name in args:
+    ids.append(Id(name.value))
+    ids[-1].lineno = name.lineno
+  func.args = ListNode(*ids)
   return func
 
 
@@ -320,23 +401,44 @@ def call_args(call, depth):
   return call
 
 
+@rewrites
+def positions(node, depth):
+  """ Nodes take the source line of their first child. """
+  if isinstance(node, Node) and node.lineno is None:
+    for child in node:
+      if child.lineno is not None:
+        node.lineno = child.lineno
+        break
+  return node
+
+
 def pretty_print(ast, lvl=0):
   """ Prints AST in a more or less readable form """
-  prefix = " "*lvl
-  for e in ast:
+  stack = [(e, lvl) for e in reversed(ast)]
+  while stack:
+    e, l = stack.pop()
+    prefix = " "*l
     if isinstance(e, Node):
       print(prefix, type(e).__name__)
-      pretty_print(e, lvl+1)
+      stack.extend((n, l+1) for n in reversed(e))
     else:
       print(prefix, e)
   if lvl == 0:
     print()
 
 
+def size(tree):
+  """ Number of nodes and leaves in the tree. """
+  return sum(1 for _ in walk(tree))
+
+
 def parse(ast):
   """ Parses tokens into ast. """
-  ast = rewrite(ast, func_args)
+  with phase("func_args"):
+    ast = rewrite(ast, func_args)
   for f in rewrite_funcs:
     log.rewrite("aplying", f.__name__)
-    ast = rewrite(ast, f)
+    with phase(f.__name__) as p:
+      ast = rewrite(ast, f)
+      p.count(nodes=lambda: size(ast))
   return ast
\ No newline at end of file
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Memory of a parsed program as a tree of Nodes and as an Arena,
+and the cost of serializing and materializing the arena.
+"""
+
+import os.path
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from log import logfilter
+from tokenizer import tokenize
+from indent import parse as indent_parse
+from ast import parse, size
+from interpreter import astMap
+from arena import Arena, tree_bytes
+from time import perf_counter
+import tracemalloc
+import argparse
+
+FUNC = """
+f%(i)d = (x, y) ->
+  match
+    x > %(i)d => (f%(i)d x - 1, y + 2) * 3
+    x == 0 => p "zero {y}"
+    _ => [x, y, "item %(i)d"][1]
+"""
+
+
+def traced(f):
+  """ Returns (result, bytes still allocated by f). """
+  tracemalloc.start()
+  result = f()
+  mem = tracemalloc.get_traced_memory()[0]
+  tracemalloc.stop()
+  return result, mem
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser()
+  parser.add_argument('-f', '--functions', type=int, default=2000, help="functions in the program")
+  args = parser.parse_args()
+  logfilter.default = False
+
+  src = "".join(FUNC % {'i': i} for i in range(args.functions))
+  tokens = indent_parse(tokenize(src))
+  tree, tree_mem = traced(lambda: parse(tokens))
+  elements = size(tree)
+  arena, arena_mem = traced(lambda: Arena.from_tree(tree))
+  t = perf_counter()
+  Arena.from_tree(tree)
+  build = perf_counter() - t
+
+  t = perf_counter()
+  data = arena.dumps()
+  dump = perf_counter() - t
+  t = perf_counter()
+  Arena.loads(data)
+  load = perf_counter() - t
+  t = perf_counter()
+  arena.to_tree(astMap)
+  materialize = perf_counter() - t
+
+  print("%d elements" % elements)
+  print("%-24s %12s %10s" % ("", "bytes", "per elem"))
+  print("%-24s %12d %10.1f" % ("tree (traced)", tree_mem, tree_mem/elements))
+  print("%-24s %12d %10.1f" % ("tree (getsizeof)", tree_bytes(tree), tree_bytes(tree)/elements))
+  print("%-24s %12d %10.1f" % ("arena (traced)", arena_mem, arena_mem/elements))
+  print("%-24s %12d %10.1f" % ("arena (nbytes)", arena.nbytes(), arena.nbytes()/elements))
+  print("%-24s %12d %10.1f" % ("serialized", len(data), len(data)/elements))
+  print("build %.1f ms, dumps %.1f ms, loads %.1f ms, to_tree(astMap) %.1f ms"
+        % (build*1000, dump*1000, load*1000, materialize*1000))
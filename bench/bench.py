@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Benchmarks every phase of the pipeline (tokenize, indent.parse,
+ast.parse, replace_nodes and run) on generated and hand-written
+workloads. Results are saved as json and can be compared with
+the results of another commit:
+
+  bench/bench.py --save before.json
+  ... hack hack hack ...
+  bench/bench.py --compare before.json --threshold 0.2
+"""
+
+import os.path
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from log import logfilter
+from tokenizer import tokenize
+from indent import parse as indent_parse
+from ast import parse
+from interpreter import translate, run
+from contextlib import redirect_stdout
+from time import perf_counter
+from glob import glob
+import tracemalloc
+import subprocess
+import platform
+import argparse
+import json
+
+PHASES = ['tokenize', 'indent', 'parse', 'replace_nodes', 'run']
+WORKLOADS = os.path.join(os.path.dirname(__file__), 'workloads')
+
+
+#############
+# WORKLOADS #
+#############
+
+generators = {}
+def workload(f):
+  generators[f.__name__] = f
+  return f
+
+
+@workload
+def large_source(n=300):
+  """ Many small functions, only one of them is called. """
+  lines = []
+  for i in range(n):
+    lines += ["f%s = (a, b) ->" % i,
+              "  c = a + b * %s" % i,
+              "  d = c - 1",
+              "  match",
+              "    d > %s => d" % i,
+              "    _ => c"]
+  lines += ["main = (argc, argv) ->", "  f0 1, 2"]
+  return "\n".join(lines)
+
+
+@workload
+def deep_nesting(depth=40):
+  """ Nested match blocks. """
+  lines = ["main = (argc, argv) ->"]
+  for i in range(depth):
+    pad = "  " + "    "*i
+    lines += [pad + "match", pad + "  argc > 0 =>"]
+  lines += ["  " + "    "*depth + "argc"]
+  return "\n".join(lines)
+
+
+@workload
+def many_operators(n=200):
+  """ Long arithmetic expressions. """
+  expr = " + ".join("%s * %s - %s" % (i, i+1, i+2) for i in range(20))
+  lines = ["main = (argc, argv) ->"]
+  lines += ["  x = %s" % expr for _ in range(n)]
+  lines += ["  0"]
+  return "\n".join(lines)
+
+
+@workload
+def recursion(depth=60, times=20):
+  """ Recursive counting through match. """
+  lines = ["count = (val, n) ->",
+           "  match",
+           "    n > 0 => count (val + 1), n - 1",
+           "    _     => val",
+           "main = (argc, argv) ->"]
+  lines += ["  count %s, %s" % (i, depth) for i in range(times)]
+  return "\n".join(lines)
+
+
+@workload
+def interpolation(n=200):
+  """ Strings with variable substitution. """
+  lines = ["main = (argc, argv) ->"]
+  lines += ["  v%s = %s" % (i, i) for i in range(10)]
+  text = " ".join("{v%s}" % i for i in range(10))
+  lines += ['  p "line: %s"' % text for _ in range(n)]
+  lines += ["  0"]
+  return "\n".join(lines)
+
+
+@workload
+def regex(n=200):
+  """ Regular expression matching with group binding. """
+  lines = ["main = (argc, argv) ->",
+           '  s = "user=root shell=/bin/sh"']
+  lines += ["  r = s =~ /user=(?P<user>\\w+) shell=(?P<shell>\\S+)/" for _ in range(n)]
+  lines += ["  0"]
+  return "\n".join(lines)
+
+
+@workload
+def shell(n=10):
+  """ Shell command invocations. """
+  lines = ["main = (argc, argv) ->"]
+  lines += ["  x = `echo hello %s`" % i for i in range(n)]
+  lines += ["  0"]
+  return "\n".join(lines)
+
+
+def workloads():
+  """ Yields (name, source) of all workloads. """
+  for name, gen in generators.items():
+    yield name, gen()
+  for path in sorted(glob(os.path.join(WORKLOADS, '*.ls'))):
+    with open(path) as fd:
+      yield os.path.basename(path), fd.read()
+
+
+###########
+# RUNNING #
+###########
+
+def pipeline(src, hook):
+  """ Runs all phases, hook(phase) is called before and after each one. """
+  with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+    hook('tokenize'); tokens = tokenize(src)
+    hook('indent');   tree = indent_parse(tokens)
+    hook('parse');    tree = parse(tree)
+    hook('replace_nodes'); tree = translate(tree)
+    hook('run');      run(tree, ['bench'])
+    hook(None)
+
+
+def timings(src):
+  times = {}
+  current = [None, 0]
+  def hook(phase):
+    t = perf_counter()
+    if current[0]:
+      times[current[0]] = t - current[1]
+    current[:] = phase, perf_counter()
+  pipeline(src, hook)
+  return times
+
+
+def memory(src):
+  peaks = {}
+  current = [None]
+  def hook(phase):
+    if current[0]:
+      peaks[current[0]] = tracemalloc.get_traced_memory()[1]
+    tracemalloc.reset_peak()
+    current[0] = phase
+  tracemalloc.start()
+  try:
+    pipeline(src, hook)
+  finally:
+    tracemalloc.stop()
+  return peaks
+
+
+def measure(src, repeat):
+  best = {}
+  for _ in range(repeat):
+    for phase, t in timings(src).items():
+      best[phase] = min(t, best.get(phase, t))
+  peaks = memory(src)
+  return {phase: {'time': best[phase], 'peak': peaks[phase]} for phase in PHASES}
+
+
+def meta():
+  try:
+    commit = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+      cwd=os.path.dirname(os.path.abspath(__file__)), stderr=subprocess.DEVNULL).decode().strip()
+  except (OSError, subprocess.CalledProcessError):
+    commit = None
+  return {'commit': commit, 'python': platform.python_version()}
+
+
+def compare(results, baseline, threshold, min_time):
+  """ Returns list of regressions as (workload, phase, old, new). """
+  regressions = []
+  for name, phases in results.items():
+    for phase, r in phases.items():
+      try:
+        old = baseline['results'][name][phase]['time']
+      except KeyError:
+        continue
+      if r['time'] > min_time and r['time'] > old*(1+threshold):
+        regressions.append((name, phase, old, r['time']))
+  return regressions
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser()
+  parser.add_argument('-r', '--repeat', type=int, default=5, help="take best of N runs")
+  parser.add_argument('-k', '--only', metavar='NAME', help="run only workloads containing NAME")
+  parser.add_argument('--save', metavar='PATH', help="save results as json")
+  parser.add_argument('--compare', metavar='PATH', help="compare with results saved earlier")
+  parser.add_argument('--threshold', type=float, default=0.2,
+                      help="fail if a phase is slower by this fraction (default: %(default)s)")
+  parser.add_argument('--min-time', type=float, default=0.001,
+                      help="ignore phases faster than this, in seconds (default: %(default)s)")
+  args = parser.parse_args()
+  logfilter.default = False
+
+  results = {}
+  print("%-16s" % "workload" + "".join("%15s" % p for p in PHASES) + "%12s" % "peak, KiB")
+  for name, src in workloads():
+    if args.only and args.only not in name:
+      continue
+    results[name] = r = measure(src, args.repeat)
+    print("%-16s" % name + "".join("%12.2f ms" % (r[p]['time']*1000) for p in PHASES)
+          + "%12d" % (max(r[p]['peak'] for p in PHASES) // 1024))
+
+  if args.save:
+    with open(args.save, 'w') as fd:
+      json.dump({'meta': meta(), 'results': results}, fd, indent=1)
+
+  if args.compare:
+    with open(args.compare) as fd:
+      baseline = json.load(fd)
+    regressions = compare(results, baseline, args.threshold, args.min_time)
+    for name, phase, old, new in regressions:
+      print("REGRESSION %s/%s: %.2f ms -> %.2f ms (%+.0f%%)" % \
+        (name, phase, old*1000, new*1000, (new/old-1)*100))
+    if regressions:
+      sys.exit(1)
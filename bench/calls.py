@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+""" Function calls per second on recursive functions, memoization off.
+    With --budget the runs are charged to a Budget with limits that
+    are never reached, to see the cost of the checks.
+"""
+
+import os.path
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from log import logfilter
+from tokenizer import tokenize
+from indent import parse as indent_parse
+from ast import parse
+from interpreter import translate, run
+from frame import Frame
+from limits import Budget
+from time import perf_counter
+import argparse
+
+FIB = """
+fib = (n) ->
+  match
+    n < 2 => n
+    _     => (fib n - 1) + (fib n - 2)
+main = (argc, argv) ->
+  fib %d
+"""
+
+COUNT = """
+count = (acc, n) ->
+  match
+    n > 0 => count (acc + 1), n - 1
+    _     => acc
+main = (argc, argv) ->
+"""
+
+
+def fib_calls(n):
+  """ Number of calls made by fib n, main included. """
+  a, b = 1, 1  # calls of fib 0 and fib 1
+  for _ in range(n-1):
+    a, b = b, a + b + 1
+  return (b if n else a) + 1
+
+
+def workloads(n, depth, times):
+  yield "fib %d" % n, FIB % n, fib_calls(n)
+  src = COUNT + "".join("  count 0, %d\n" % depth for _ in range(times))
+  yield "count %d x %d" % (depth, times), src, (depth+1)*times + 1
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser()
+  parser.add_argument('-n', type=int, default=18, help="fib argument")
+  parser.add_argument('-d', '--depth', type=int, default=100, help="depth of count")
+  parser.add_argument('-t', '--times', type=int, default=200, help="calls of count from main")
+  parser.add_argument('-r', '--repeat', type=int, default=3)
+  parser.add_argument('-b', '--budget', action='store_true', help="run with a budget")
+  args = parser.parse_args()
+  logfilter.default = False
+
+  print("%-20s %10s %12s %14s %10s" % ("workload", "calls", "best, ms", "calls/s", "frames"))
+  for name, src, calls in workloads(args.n, args.depth, args.times):
+    best = None
+    for _ in range(args.repeat):
+      tree = translate(parse(indent_parse(tokenize(src))))
+      created = Frame.created
+      t = perf_counter()
+      budget = Budget(calls=10**12, seconds=10**6, shells=10**6, memory=2**50) if args.budget else None
+      run(tree, ['bench'], memoize=False, budget=budget)
+      t = perf_counter() - t
+      best = t if best is None else min(best, t)
+    print("%-20s %10d %12.2f %14.0f %10d" % (name, calls, best*1000, calls/best, Frame.created - created))
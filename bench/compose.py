@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+""" A pipeline of functions as a composition against nested calls. """
+
+import os.path
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from log import logfilter
+from tokenizer import tokenize
+from indent import parse as indent_parse
+from ast import parse
+from interpreter import translate, run
+from time import perf_counter
+import argparse
+
+FUNCS = """
+inc = (x) -> x + 1
+dbl = (x) -> x * 2
+dec = (x) -> x - 1
+"""
+
+COMPOSED = FUNCS + """
+pipe = inc . dbl . dec . inc . dbl . dec
+main = (argc, argv) ->
+  r = count (pipe . (1 .. %d))
+  0
+"""
+
+NESTED = FUNCS + """
+pipe = (x) -> inc (dbl (dec (inc (dbl (dec x)))))
+main = (argc, argv) ->
+  r = count (pipe . (1 .. %d))
+  0
+"""
+
+
+def timed(src, repeat):
+  best = None
+  for _ in range(repeat):
+    tree = translate(parse(indent_parse(tokenize(src))))
+    t = perf_counter()
+    run(tree, ['bench'], memoize=False)
+    t = perf_counter() - t
+    best = t if best is None else min(best, t)
+  return best
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser()
+  parser.add_argument('-n', type=int, default=5000, help="elements pushed through the pipeline")
+  parser.add_argument('-r', '--repeat', type=int, default=3)
+  args = parser.parse_args()
+  logfilter.default = False
+
+  nested = timed(NESTED % args.n, args.repeat)
+  composed = timed(COMPOSED % args.n, args.repeat)
+  print("%d elements through 6 functions" % args.n)
+  print("  nested calls: %10.2f ms" % (nested*1000))
+  print("  composition:  %10.2f ms (x%.2f)" % (composed*1000, nested/composed))
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Deeply nested programs: a left-deep expression "1 + 1 + ... + 1"
+and nested match blocks. Measures the passes that walk the tree
+with an explicit stack. eval() and infer_type() are recursive, so
+running these programs or checking them with dead.py -c still hits
+the recursion limit; they are not measured.
+"""
+
+import os.path
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from log import logfilter
+from tokenizer import tokenize
+from indent import parse as indent_parse
+from ast import parse, pretty_print, walk, postorder
+from interpreter import translate
+from contextlib import redirect_stdout
+from time import perf_counter
+import argparse
+
+
+def deep_expr(depth):
+  return "main = (argc, argv) ->\n  " + " + ".join(["1"]*(depth+1))
+
+
+def deep_blocks(depth):
+  lines = ["main = (argc, argv) ->"]
+  for i in range(depth):
+    pad = "  " + "  "*i
+    lines += [pad + "match", pad + " argc > 0 =>"]
+  lines += ["  " + "  "*depth + "argc"]
+  return "\n".join(lines)
+
+
+def passes(src):
+  """ Yields (pass name, seconds). """
+  t = perf_counter()
+  tokens = tokenize(src)
+  yield "tokenize", perf_counter() - t
+  t = perf_counter()
+  tree = indent_parse(tokens)
+  yield "indent", perf_counter() - t
+  t = perf_counter()
+  tree = parse(tree)
+  yield "parse", perf_counter() - t
+  t = perf_counter()
+  tree = translate(tree)
+  yield "replace_nodes", perf_counter() - t
+  t = perf_counter()
+  n = sum(1 for _ in walk(tree))
+  yield "walk", perf_counter() - t
+  t = perf_counter()
+  assert sum(1 for _ in postorder(tree)) == n
+  yield "postorder", perf_counter() - t
+  t = perf_counter()
+  with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+    pretty_print(tree)
+  yield "pretty_print", perf_counter() - t
+  t = perf_counter()
+  repr(tree)
+  yield "repr", perf_counter() - t
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser()
+  parser.add_argument('-d', '--depth', type=int, default=10000, help="depth of the expression")
+  parser.add_argument('-b', '--blocks', type=int, default=1000, help="depth of nested blocks")
+  args = parser.parse_args()
+  logfilter.default = False
+
+  print("recursion limit: %d" % sys.getrecursionlimit())
+  for name, src in [("expr, depth %d" % args.depth, deep_expr(args.depth)),
+                    ("blocks, depth %d" % args.blocks, deep_blocks(args.blocks))]:
+    print(name)
+    for p, t in passes(src):
+      print("  %-16s %10.2f ms" % (p, t*1000))
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+""" Latency of incremental re-parsing after edits of a big file. """
+
+import os.path
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from log import logfilter
+from tokenizer import tokenize
+from indent import parse as indent_parse
+from ast import parse
+from document import Document
+from time import perf_counter
+import argparse
+
+
+def source(lines):
+  """ Functions of 6 lines each, about the given number of lines. """
+  out = []
+  for i in range(lines // 6):
+    out += ["f%s = (a, b) ->" % i,
+            "  c = a + b * %s" % i,
+            "  d = c - 1",
+            "  match",
+            "    d > %s => d" % i,
+            "    _ => c"]
+  return "\n".join(out)
+
+
+def timed(f, *args):
+  t = perf_counter()
+  f(*args)
+  return perf_counter() - t
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser()
+  parser.add_argument('-l', '--lines', type=int, default=10000)
+  parser.add_argument('-r', '--repeat', type=int, default=20)
+  args = parser.parse_args()
+  logfilter.default = False
+
+  src = source(args.lines)
+  full = min(timed(lambda: parse(indent_parse(tokenize(src)))) for _ in range(3))
+  doc = Document(src)
+  middle = (len(doc.lines) // 12) * 6   # first line of a function in the middle
+
+  edits = [
+    ("type a digit", lambda: doc.edit(middle+1, 12, middle+1, 12, "1")),
+    ("new line in a function", lambda: doc.replace_lines(middle+3, middle+3, ["  e = d"])),
+    ("new function at the top", lambda: doc.replace_lines(0, 0, ["g = (x) -> x"])),
+  ]
+  print("%d lines, full re-parse: %.2f ms" % (len(doc.lines), full*1000))
+  print("%-26s %12s %12s %10s" % ("edit", "best, ms", "mean, ms", "re-parsed"))
+  for name, edit in edits:
+    times = [timed(edit) for _ in range(args.repeat)]
+    print("%-26s %12.2f %12.2f %10s" % (name, min(times)*1000, sum(times)/len(times)*1000, doc.reparsed))
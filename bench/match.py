@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+""" Match blocks with many "cmd == literal" arms, with and without jump tables. """
+
+import os.path
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from log import logfilter
+from tokenizer import tokenize
+from indent import parse as indent_parse
+from ast import parse
+from interpreter import translate, run, Match
+from time import perf_counter
+import argparse
+
+
+def router(arms, calls):
+  lines = ["route = (cmd) ->", "  match"]
+  lines += ['    cmd == %d => "arm%d"' % (i, i) for i in range(arms)]
+  lines += ['    _ => "default"',
+            "loop = (n, base) ->",
+            "  match",
+            "    n > 0 =>",
+            "      route (base + n)",
+            "      loop n - 1, base",
+            "    _ => 0",
+            "main = (argc, argv) ->"]
+  # short loops over all keys, deep recursion would hit the recursion limit
+  for _ in range(max(1, calls // arms)):
+    lines += ["  loop 50, %d" % base for base in range(0, arms, 50)]
+  return "\n".join(lines)
+
+
+def timed(src, min_table, repeat):
+  best = None
+  for _ in range(repeat):
+    tree = translate(parse(indent_parse(tokenize(src))))
+    Match.min_table = min_table
+    t = perf_counter()
+    run(tree, ['bench'], memoize=False)
+    t = perf_counter() - t
+    best = t if best is None else min(best, t)
+  return best
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser()
+  parser.add_argument('-a', '--arms', type=int, default=200)
+  parser.add_argument('-c', '--calls', type=int, default=2000)
+  parser.add_argument('-r', '--repeat', type=int, default=5)
+  args = parser.parse_args()
+  logfilter.default = False
+
+  src = router(args.arms, args.calls)
+  default = Match.min_table
+  linear = timed(src, float('inf'), args.repeat)
+  table = timed(src, default, args.repeat)
+  Match.min_table = default
+  print("%d arms, %d calls" % (args.arms, args.calls))
+  print("  in order:   %10.2f ms" % (linear*1000))
+  print("  jump table: %10.2f ms (x%.1f)" % (table*1000, linear/table))
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Tokenizer throughput in lines per second with the interpreted
+grammar (tokenizer.PROGRAM.parse) and with the parser generated by
+peggen.py. Before timing both parsers are run on the test scripts
+and on random lines, the script exits with 1 if they disagree.
+"""
+
+import os.path
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from log import logfilter
+from tokenizer import PROGRAM
+from time import perf_counter
+from glob import glob
+import peggen
+import argparse
+import random
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+LINES = [
+  'f%d = (a, b) ->',
+  '  c = a + b * 42 # comment',
+  '  s = "value of c is {c}" + `echo shell`',
+  '  match',
+  '    s =~ /value (?P<v>[0-9]+)/ => p v',
+  '    c > 10.5 => [c, 1..10][0] // another comment',
+  '    _ => f . g $ h /* c-style */',
+]
+ALPHABET = list('ab1 2.="`/#*-+<>=~()[],_$@!^x') + [' . ', 'p ', 'match', '->', '..']
+
+
+def corpus():
+  """ Lines of the test scripts and random lines. """
+  lines = []
+  for path in glob(os.path.join(ROOT, 'tests', '**', '*.ls'), recursive=True) + \
+              glob(os.path.join(ROOT, 'bench', '**', '*.ls'), recursive=True):
+    with open(path) as fd:
+      lines += fd.read().splitlines()
+  rnd = random.Random(1)
+  lines += ["".join(rnd.choice(ALPHABET) for _ in range(rnd.randint(0, 20))) for _ in range(20000)]
+  return lines
+
+
+def throughput(parse, lines, repeat):
+  best = None
+  for _ in range(repeat):
+    t = perf_counter()
+    for l in lines:
+      parse(l)
+    t = perf_counter() - t
+    best = t if best is None else min(best, t)
+  return len(lines) / best
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser()
+  parser.add_argument('-n', '--lines', type=int, default=20000)
+  parser.add_argument('-r', '--repeat', type=int, default=3, help="take best of N runs")
+  args = parser.parse_args()
+  logfilter.default = False
+
+  generated = peggen.load(PROGRAM)
+  texts = corpus()
+  diffs = peggen.differential(PROGRAM, generated, texts)
+  for text, expected, got in diffs[:10]:
+    print("MISMATCH %r:\n  expected %r\n  got      %r" % (text, expected, got))
+  print("differential: %d lines, %d mismatches" % (len(texts), len(diffs)))
+  if diffs:
+    sys.exit(1)
+
+  lines = [LINES[i % len(LINES)].replace('%d', str(i)) for i in range(args.lines)]
+  interpreted = throughput(PROGRAM.parse, lines, args.repeat)
+  compiled = throughput(generated, lines, args.repeat)
+  print("%-12s %12s" % ("", "lines/s"))
+  print("%-12s %12.0f" % ("interpreted", interpreted))
+  print("%-12s %12.0f  x%.1f" % ("generated", compiled, compiled / interpreted))
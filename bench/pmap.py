@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+""" pmap against a serial map on a CPU-bound function. """
+
+import os.path
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from log import logfilter
+from tokenizer import tokenize
+from indent import parse as indent_parse
+from ast import parse
+from interpreter import translate, run
+from time import perf_counter
+import parallel
+import argparse
+
+SRC = """
+fib = (n) ->
+  match
+    n < 2 => n
+    _     => (fib n - 1) + (fib n - 2)
+main = (argc, argv) ->
+  r = pmap fib, [%s]
+  0
+"""
+
+
+def timed(src):
+  tree = translate(parse(indent_parse(tokenize(src))))
+  t = perf_counter()
+  run(tree, ['bench'], memoize=False)
+  return perf_counter() - t
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser()
+  parser.add_argument('-n', '--items', type=int, default=64)
+  parser.add_argument('-f', '--fib', type=int, default=14, help="work per element")
+  parser.add_argument('-w', '--workers', type=int, default=None)
+  args = parser.parse_args()
+  logfilter.default = False
+
+  src = SRC % ", ".join([str(args.fib)]*args.items)
+  parallel.workers = args.workers
+  min_items = parallel.min_items
+  parallel.min_items = float('inf')
+  serial = timed(src)
+  parallel.min_items = min_items
+  timed(src)  # start the pool
+  par = timed(src)
+  print("%d x fib %d, %d workers" % (args.items, args.fib, args.workers or os.cpu_count()))
+  print("  serial:   %10.2f ms" % (serial*1000))
+  print("  parallel: %10.2f ms (x%.2f)" % (par*1000, serial/par))
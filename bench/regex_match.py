@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+""" A log classifier: a match block with many "line =~ /regex/" arms
+    run over generated log lines, with the arms tried in order and
+    with the regexes combined into one alternation. The in-order run
+    is slow, it gets only --sample lines.
+"""
+
+import os.path
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from log import logfilter
+from tokenizer import tokenize
+from indent import parse as indent_parse
+from ast import parse
+from interpreter import translate, run, Match
+from time import perf_counter
+import argparse
+import random
+import tempfile
+
+SERVICES = ["auth", "db", "cache", "queue", "api", "mail", "dns", "disk", "cron", "web"]
+LEVELS = ["ERROR", "WARN", "INFO", "DEBUG", "TRACE"]
+UNMATCHED = "NOTICE misc: nothing to see here"
+
+
+def patterns(n):
+  """ n regexes and a line matched by each of them. """
+  result = []
+  for i in range(n):
+    level, service = LEVELS[i % len(LEVELS)], SERVICES[i // len(LEVELS) % len(SERVICES)]
+    regex = r"%s %s%d: (?P<msg>\w+) took (?P<ms>[0-9]+)ms" % (level, service, i)
+    line = "%s %s%d: request took %dms" % (level, service, i, i * 7)
+    result.append((regex, line))
+  return result
+
+
+def classifier(rules, path):
+  lines = ["classify = (line) ->", "  match"]
+  lines += ["    line =~ /%s/ => %d" % (regex, i + 1) for i, (regex, _) in enumerate(rules)]
+  lines += ["    _ => 0",
+            "main = (argc, argv) ->",
+            "  count (map classify, (lines `cat %s`))" % path]
+  return "\n".join(lines)
+
+
+def log(rules, n, seed=1):
+  rnd = random.Random(seed)
+  samples = [line for _, line in rules] + [UNMATCHED]
+  return "\n".join(rnd.choice(samples) for _ in range(n)) + "\n"
+
+
+def timed(rules, text, min_table, repeat):
+  best = None
+  with tempfile.NamedTemporaryFile('w', suffix='.log') as fd:
+    fd.write(text)
+    fd.flush()
+    src = classifier(rules, fd.name)
+    for _ in range(repeat):
+      tree = translate(parse(indent_parse(tokenize(src))))
+      Match.min_table = min_table
+      t = perf_counter()
+      run(tree, ['bench'], memoize=False)
+      t = perf_counter() - t
+      best = t if best is None else min(best, t)
+  return best
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser()
+  parser.add_argument('-p', '--patterns', type=int, default=50)
+  parser.add_argument('-n', '--lines', type=int, default=1000000)
+  parser.add_argument('-s', '--sample', type=int, default=50000, help="lines for the in-order run")
+  parser.add_argument('-r', '--repeat', type=int, default=1)
+  args = parser.parse_args()
+  logfilter.default = False
+
+  rules = patterns(args.patterns)
+  default = Match.min_table
+  linear = timed(rules, log(rules, args.sample), float('inf'), args.repeat)
+  combined = timed(rules, log(rules, args.lines), default, args.repeat)
+  Match.min_table = default
+  linear_rate, combined_rate = args.sample / linear, args.lines / combined
+  print("%d patterns" % args.patterns)
+  print("  in order: %8d lines %10.2f s %10.0f lines/s" % (args.sample, linear, linear_rate))
+  print("  combined: %8d lines %10.2f s %10.0f lines/s (x%.1f)" %
+        (args.lines, combined, combined_rate, combined_rate / linear_rate))
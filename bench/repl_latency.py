@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Latency of the interactive interpreter: time to the first prompt
+and time to evaluate a line. Exits with 1 if a budget is exceeded.
+"""
+
+import os.path
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from log import logfilter
+from time import perf_counter
+import subprocess
+import argparse
+
+DEAD = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dead.py')
+
+
+def startup():
+  """ Starts dead.py without input and waits until it exits on EOF. """
+  t = perf_counter()
+  subprocess.run([sys.executable, DEAD], input=b"", stdout=subprocess.DEVNULL, check=True)
+  return perf_counter() - t
+
+
+def timed(f, *args):
+  t = perf_counter()
+  f(*args)
+  return perf_counter() - t
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser()
+  parser.add_argument('-r', '--repeat', type=int, default=20)
+  parser.add_argument('--startup', type=float, default=0.2,
+                      help="budget for startup, in seconds (default: %(default)s)")
+  parser.add_argument('--line', type=float, default=0.05,
+                      help="budget for one line, in seconds (default: %(default)s)")
+  args = parser.parse_args()
+  logfilter.default = False
+
+  from repl import Repl
+  repl = Repl()
+  repl.eval("f = (a) -> a * 2")
+  counter = iter(range(10**9))
+  lines = [
+    ("new expression", args.line, lambda: repl.eval("x%d = f %d" % (next(counter), 21))),
+    ("repeated expression", args.line, lambda: repl.eval("f 21")),
+    ("new definition", args.line, lambda: repl.eval("g%d = (a) -> a + %d" % (next(counter), 1))),
+  ]
+
+  failed = False
+  print("%-22s %12s %12s %12s" % ("measure", "best, ms", "worst, ms", "budget, ms"))
+  rows = [("startup", args.startup, startup)] + lines
+  for name, budget, f in rows:
+    times = [timed(f) for _ in range(args.repeat if f is not startup else 5)]
+    ok = min(times) <= budget
+    failed |= not ok
+    print("%-22s %12.2f %12.2f %12.2f%s" % (name, min(times)*1000, max(times)*1000,
+          budget*1000, "" if ok else "  OVER BUDGET"))
+  sys.exit(1 if failed else 0)
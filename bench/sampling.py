@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Overhead of the sampling profiler: fib without it, with the stack
+instrumentation only and with sampling every --interval ms.
+"""
+
+import os.path
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from log import logfilter
+from tokenizer import tokenize
+from indent import parse as indent_parse
+from ast import parse
+from interpreter import translate, run
+from profiler import Sampler
+from time import perf_counter
+import argparse
+
+FIB = """
+fib = (n) ->
+  match
+    n < 2 => n
+    _     => (fib n - 1) + (fib n - 2)
+main = (argc, argv) ->
+  fib %d
+"""
+
+
+def timed(src, sampler, repeat):
+  best = None
+  for _ in range(repeat):
+    tree = translate(parse(indent_parse(tokenize(src))))
+    t = perf_counter()
+    run(tree, ['bench'], memoize=False, sampler=sampler and sampler())
+    t = perf_counter() - t
+    best = t if best is None else min(best, t)
+  return best
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser()
+  parser.add_argument('-n', type=int, default=20, help="fib argument")
+  parser.add_argument('-i', '--interval', type=float, default=1.0, help="sampling interval, ms")
+  parser.add_argument('-r', '--repeat', type=int, default=5, help="take best of N runs")
+  args = parser.parse_args()
+  logfilter.default = False
+
+  src = FIB % args.n
+  base = timed(src, None, args.repeat)
+  print("%-24s %10s %10s" % ("", "best, ms", "overhead"))
+  print("%-24s %10.2f" % ("no sampler", base*1000))
+  for name, make in [("instrumented only", lambda: Sampler(interval=3600)),
+                     ("sampling %g ms" % args.interval, lambda: Sampler(args.interval / 1000))]:
+    t = timed(src, make, args.repeat)
+    print("%-24s %10.2f %9.1f%%" % (name, t*1000, (t/base - 1)*100))
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+""" Time and peak memory of counting and filtering lazy sequences. """
+
+import os.path
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from log import logfilter
+from tokenizer import tokenize
+from indent import parse as indent_parse
+from ast import parse
+from interpreter import translate, run
+from time import perf_counter
+import tracemalloc
+import argparse
+
+SRC = """
+sq = (x) -> x * x
+small = (x) -> x < 100
+main = (argc, argv) ->
+  n = count (1 .. %(n)d)
+  m = count (filter small, (map sq, (1 .. %(n)d)))
+  0
+"""
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser()
+  parser.add_argument('-n', type=int, nargs='+', default=[10**4, 10**5])
+  args = parser.parse_args()
+  logfilter.default = False
+
+  print("%12s %12s %12s" % ("elements", "time, ms", "peak, KiB"))
+  for n in args.n:
+    tree = translate(parse(indent_parse(tokenize(SRC % {'n': n}))))
+    tracemalloc.start()
+    t = perf_counter()
+    run(tree, ['bench'], memoize=False)
+    t = perf_counter() - t
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print("%12d %12.2f %12d" % (n, t*1000, peak // 1024))
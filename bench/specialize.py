@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Type-specialized nodes: typed programs run with the generic BinOp
+path and with operations specialized after the type check.
+Checking is done before timing, only the run is measured.
+"""
+
+import os.path
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from log import logfilter
+from tokenizer import tokenize
+from indent import parse as indent_parse
+from ast import parse
+from interpreter import translate, run, check, specialize
+from time import perf_counter
+import argparse
+
+FIB = """
+fib = (n) ->
+  match
+    n < 2 => n
+    _     => (fib n - 1) + (fib n - 2)
+main = (argc, argv) ->
+  fib %d
+"""
+
+# arithmetic and comparisons in a loop, chunks keep the recursion shallow
+ARITH = """
+loop = (acc, n) ->
+  match
+    n > 0 => loop (acc + n * 3 - 1), n - 1
+    _     => acc
+main = (argc, argv) ->
+%s  0
+"""
+
+STRINGS = """
+find = (name, n) ->
+  match
+    n == 0            => 0
+    name == "needle"  => n
+    _                 => find (name + ""), n - 1
+main = (argc, argv) ->
+%s  0
+"""
+
+
+def workloads(n, chunks):
+  yield "fib %d" % n, FIB % n
+  yield "int loop 100 x %d" % chunks, ARITH % ("  x = loop 0, 100\n" * chunks)
+  yield "str loop 100 x %d" % chunks, STRINGS % ("  x = find \"haystack\", 100\n" * chunks)
+
+
+def timed(src, special, repeat):
+  best = None
+  for _ in range(repeat):
+    tree = translate(parse(indent_parse(tokenize(src))))
+    check(tree)
+    replaced = specialize(tree) if special else 0
+    t = perf_counter()
+    run(tree, ['bench'], memoize=False)
+    t = perf_counter() - t
+    best = t if best is None else min(best, t)
+  return best, replaced
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser()
+  parser.add_argument('-n', type=int, default=20, help="fib argument")
+  parser.add_argument('-c', '--chunks', type=int, default=200, help="loop calls from main")
+  parser.add_argument('-r', '--repeat', type=int, default=5, help="take best of N runs")
+  args = parser.parse_args()
+  logfilter.default = False
+
+  print("%-22s %12s %14s %8s %8s" % ("workload", "generic, ms", "specialized, ms", "nodes", "speedup"))
+  for name, src in workloads(args.n, args.chunks):
+    generic, _ = timed(src, False, args.repeat)
+    special, replaced = timed(src, True, args.repeat)
+    print("%-22s %12.2f %14.2f %8d %7.2fx" % (name, generic*1000, special*1000, replaced, generic/special))
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Startup time of `dead.py -n tests/hello.ls`. Shows the slowest
+imports reported by `python -X importtime` and exits with 1 if
+the best wall time is over the target.
+"""
+
+import os.path
+import subprocess
+import argparse
+import sys
+from time import perf_counter
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+CMD = [os.path.join(ROOT, 'dead.py'), '-n', os.path.join(ROOT, 'tests', 'hello.ls')]
+
+
+def wall():
+  t = perf_counter()
+  subprocess.run([sys.executable] + CMD, check=True, stdout=subprocess.DEVNULL)
+  return perf_counter() - t
+
+
+def imports():
+  """ Returns [(cumulative us, self us, module)] of the startup. """
+  p = subprocess.run([sys.executable, '-X', 'importtime'] + CMD, check=True,
+                     stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+  result = []
+  for line in p.stderr.decode().splitlines():
+    if not line.startswith("import time:") or "self [us]" in line:
+      continue
+    own, cumulative, name = line[len("import time:"):].split("|")
+    result.append((int(cumulative), int(own), name.rstrip()))
+  return result
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser()
+  parser.add_argument('-r', '--repeat', type=int, default=10, help="take best of N runs")
+  parser.add_argument('-n', '--top', type=int, default=15, help="show N slowest imports")
+  parser.add_argument('--target', type=float, default=0.06,
+                      help="fail if startup is slower, in seconds (default: %(default)s)")
+  args = parser.parse_args()
+
+  records = imports()
+  total = sum(own for _, own, _ in records)
+  print("%12s %12s  %s" % ("cumul, ms", "self, ms", "module"))
+  for cumulative, own, name in sorted(records, reverse=True)[:args.top]:
+    print("%12.2f %12.2f  %s" % (cumulative/1000, own/1000, name))
+  print("%d modules imported in %.2f ms" % (len(records), total/1000))
+
+  best = min(wall() for _ in range(args.repeat))
+  ok = best <= args.target
+  print("startup: %.2f ms, target %.2f ms%s" % (best*1000, args.target*1000, "" if ok else "  OVER TARGET"))
+  sys.exit(0 if ok else 1)
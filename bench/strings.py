@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+String building: repeated append with ropes and with joining on
+every Add (Str.small = inf), in a script and with Str.Add alone,
+and interpolation of big templates. The script runs with memoization
+on, as dead.py does by default (--no-memo turns it off). Str.Add alone
+is never slower with ropes. In the script the calls take most of the
+time: without memoization ropes and joining are within noise up to
+about 2000 appends (100 KiB), ropes pay off on longer strings.
+"""
+
+import os.path
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from log import logfilter
+from tokenizer import tokenize
+from indent import parse as indent_parse
+from ast import parse
+from interpreter import translate, run, Str
+from frame import Frame
+from contextlib import redirect_stdout
+from time import perf_counter
+import argparse
+
+APPEND = """
+build = (s, n) ->
+  match
+    n > 0 => build (s + "a line of the report with some padding text in it\\n"), n - 1
+    _     => s
+main = (argc, argv) ->
+  s = ""
+%s  n = s =~ /a line/
+  0
+"""
+
+
+PIECE = "a line of the report with some padding text in it\n"
+
+
+def run_src(src, memoize):
+  tree = translate(parse(indent_parse(tokenize(src))))
+  t = perf_counter()
+  run(tree, ['bench'], memoize=memoize)
+  return perf_counter() - t
+
+
+def append(pieces, memoize=True):
+  """ pieces appends in calls of build 100 deep, matched once at the end. """
+  return run_src(APPEND % ("  s = build s, 100\n" * (pieces // 100)), memoize)
+
+
+def add(pieces):
+  """ pieces calls of Str.Add, joined once at the end. """
+  piece = Str(PIECE)
+  t = perf_counter()
+  s = Str("")
+  for _ in range(pieces):
+    s = s.Add(piece)
+  s.value
+  return perf_counter() - t
+
+
+def best(f, pieces, repeat, small=Str.small):
+  """ Shortest of repeat runs of f with the given Str.small. """
+  default, Str.small = Str.small, small
+  try:
+    return min(f(pieces) for _ in range(repeat))
+  finally:
+    Str.small = default
+
+
+def interpolate(names, size):
+  frame = Frame()
+  for i in range(names):
+    frame['v%d' % i] = Str("x" * size)
+  template = Str(" ".join("{v%d}" % i for i in range(names)))
+  t = perf_counter()
+  with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+    print(template.to_string(frame))
+  return perf_counter() - t
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser()
+  parser.add_argument('-p', '--pieces', type=int, nargs='+', default=[500, 2000, 8000])
+  parser.add_argument('-n', '--names', type=int, default=2000, help="placeholders in the template")
+  parser.add_argument('-s', '--size', type=int, default=1000, help="length of substituted values")
+  parser.add_argument('-r', '--repeat', type=int, default=3, help="runs of each case, the best is shown")
+  parser.add_argument('--no-memo', action='store_const', const=True, default=False,
+                      help="run the script without memoization")
+  args = parser.parse_args()
+  logfilter.default = False
+
+  script = lambda pieces: append(pieces, memoize=not args.no_memo)
+  print("%-10s %14s %14s %14s %14s" % ("appends", "script rope", "script join", "Add rope", "Add join"))
+  for pieces in args.pieces:
+    times = [best(script, pieces, args.repeat), best(script, pieces, args.repeat, float('inf')),
+             best(add, pieces, args.repeat), best(add, pieces, args.repeat, float('inf'))]
+    print("%-10d" % pieces + "".join("%11.2f ms" % (t*1000) for t in times))
+  t = interpolate(args.names, args.size)
+  print("interpolation of %d placeholders into %d KiB: %.2f ms" %
+        (args.names, args.names*args.size // 1024, t*1000))
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+""" Type checking time versus program size, full and incremental. """
+
+import os.path
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from log import logfilter
+from tokenizer import tokenize
+from indent import parse as indent_parse
+from ast import parse
+from interpreter import translate, check
+from typeinfer import Checker
+import interpreter
+import argparse
+import time
+
+
+def program(n, edited=None):
+  """ A chain of n functions, each one calls the previous one. """
+  lines = ["f0 = (x) -> x + 1"]
+  for i in range(1, n):
+    const = 2 if i == edited else 1
+    lines.append("f%s = (x) -> f%s x + %s" % (i, i-1, const))
+  lines.append("main = (argc, argv) -> f%s argc" % (n-1))
+  return "\n".join(lines)
+
+
+def compile(src):
+  return translate(parse(indent_parse(tokenize(src))))
+
+
+def measure(n):
+  ast = compile(program(n))
+  checker = Checker(interpreter.builtins)
+  t = time.perf_counter()
+  check(ast, checker)
+  full = time.perf_counter() - t
+  before = checker.checked
+
+  ast = compile(program(n, edited=n//2))
+  t = time.perf_counter()
+  check(ast, checker)
+  incremental = time.perf_counter() - t
+  return full, incremental, checker.checked - before
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser()
+  parser.add_argument('sizes', nargs='*', type=int, default=[10, 100, 500, 1000, 2000])
+  args = parser.parse_args()
+  logfilter.default = False
+
+  print("%8s %12s %12s %10s" % ("defs", "full, ms", "incr, ms", "rechecked"))
+  for n in args.sizes:
+    full, incremental, rechecked = measure(n)
+    print("%8s %12.2f %12.2f %10s" % (n+1, full*1000, incremental*1000, rechecked))
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Warm interpreter daemon. The master imports the whole pipeline once
+and forks a pool of workers that accept requests on a Unix socket:
+
+  {"script": path, "argv": [...], "env": {...}, "cwd": path,
+   "budget": {"calls": N, "seconds": S, "shells": N, "memory": bytes}}
+
+The budget is optional, a program that exceeds it exits with 3
+(see limits.py).
+
+A worker keeps compiled programs keyed by (path, mtime, size) and
+runs every request in a forked child, so programs cannot see each
+other's state. Output of the child (including shell commands) is
+streamed back as frames, the last frame carries the exit code.
+See deadc.py for the client.
+
+Stdin of the programs is /dev/null.
+"""
+
+from collections import OrderedDict
+import argparse
+import selectors
+import signal
+import socket
+import struct
+import json
+import os
+import sys
+
+# frame: kind, payload length, payload
+HEADER = struct.Struct("!BI")
+STDOUT, STDERR, EXIT = 1, 2, 3
+
+
+def default_socket():
+  return os.environ.get("DEAD_SOCKET") or "/tmp/deadscript-%d.sock" % os.getuid()
+
+
+def send_frame(sock, kind, payload):
+  sock.sendall(HEADER.pack(kind, len(payload)) + payload)
+
+
+def recv_exactly(sock, n):
+  buf = b""
+  while len(buf) < n:
+    chunk = sock.recv(n - len(buf))
+    if not chunk:
+      raise EOFError("connection closed")
+    buf += chunk
+  return buf
+
+
+def recv_frame(sock):
+  kind, length = HEADER.unpack(recv_exactly(sock, HEADER.size))
+  return kind, recv_exactly(sock, length)
+
+
+def preload():
+  """ Imports the pipeline so workers inherit it warm. """
+  global tokenize, indent_parse, parse, translate, run, logfilter, Budget, BudgetExceeded
+  from tokenizer import tokenize
+  from indent import parse as indent_parse
+  from ast import parse
+  from interpreter import translate, run
+  from limits import Budget, BudgetExceeded
+  from log import logfilter
+  logfilter.default = False
+
+
+##########
+# WORKER #
+##########
+
+class Worker:
+  def __init__(self, listener, maxprograms=64):
+    self.listener = listener
+    self.programs = OrderedDict()  # (path, mtime, size) -> translated tree
+    self.maxprograms = maxprograms
+
+  def compile(self, path):
+    st = os.stat(path)
+    key = (path, st.st_mtime_ns, st.st_size)
+    try:
+      self.programs.move_to_end(key)
+      return self.programs[key]
+    except KeyError:
+      pass
+    with open(path) as fd:
+      tree = translate(parse(indent_parse(tokenize(fd.read()))))
+    self.programs[key] = tree
+    if len(self.programs) > self.maxprograms:
+      self.programs.popitem(last=False)
+    return tree
+
+  def serve(self):
+    while True:
+      conn, _ = self.listener.accept()
+      with conn:
+        try:
+          self.handle(conn)
+        except (OSError, EOFError):
+          pass  # client went away
+
+  def handle(self, conn):
+    raw = b""
+    while True:
+      chunk = conn.recv(65536)
+      if not chunk:
+        break
+      raw += chunk
+    req = json.loads(raw.decode())
+    path = os.path.join(req.get("cwd", "/"), req["script"])
+    try:
+      tree = self.compile(path)
+    except Exception as err:
+      send_frame(conn, STDERR, ("%s: %s\n" % (type(err).__name__, err)).encode())
+      send_frame(conn, EXIT, struct.pack("!i", 1))
+      return
+
+    out_r, out_w = os.pipe()
+    err_r, err_w = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+      os.close(out_r); os.close(err_r)
+      self.child(tree, req, out_w, err_w)
+    os.close(out_w); os.close(err_w)
+    try:
+      self.relay(conn, {out_r: STDOUT, err_r: STDERR})
+    except OSError:
+      os.kill(pid, signal.SIGKILL)
+      raise
+    finally:
+      os.close(out_r); os.close(err_r)
+      _, status = os.waitpid(pid, 0)
+    if os.WIFSIGNALED(status):
+      rc = 128 + os.WTERMSIG(status)
+    else:
+      rc = os.WEXITSTATUS(status)
+    send_frame(conn, EXIT, struct.pack("!i", rc))
+
+  def relay(self, conn, fds):
+    with selectors.DefaultSelector() as sel:
+      for fd in fds:
+        sel.register(fd, selectors.EVENT_READ)
+      while sel.get_map():
+        for key, _ in sel.select():
+          data = os.read(key.fd, 65536)
+          if data:
+            send_frame(conn, fds[key.fd], data)
+          else:
+            sel.unregister(key.fd)
+
+  def child(self, tree, req, out, err):
+    """ Runs the program, never returns. """
+    rc = 1
+    try:
+      self.listener.close()
+      signal.signal(signal.SIGTERM, signal.SIG_DFL)
+      signal.signal(signal.SIGINT, signal.SIG_DFL)
+      null = os.open(os.devnull, os.O_RDONLY)
+      os.dup2(null, 0)
+      os.dup2(out, 1)
+      os.dup2(err, 2)
+      os.environ.clear()
+      os.environ.update(req.get("env", {}))
+      os.chdir(req.get("cwd", "/"))
+      budget = Budget(**req["budget"]) if req.get("budget") else None
+      rc = run(tree, [req["script"]] + req.get("argv", []), budget=budget)
+    except BudgetExceeded as err:
+      print(err, file=sys.stderr)
+      rc = 3
+    except SystemExit as e:  # same codes as the interpreter exiting
+      if e.code is None:
+        rc = 0
+      elif isinstance(e.code, int):
+        rc = e.code
+      else:
+        print(e.code, file=sys.stderr)
+        rc = 1
+    except BaseException:
+      import traceback
+      traceback.print_exc()
+    finally:
+      try:
+        sys.stdout.flush()
+        sys.stderr.flush()
+      finally:
+        os._exit(rc & 0xff)
+
+
+##########
+# MASTER #
+##########
+
+def spawn(listener, maxprograms):
+  pid = os.fork()
+  if pid == 0:
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # master shuts us down
+    try:
+      Worker(listener, maxprograms).serve()
+    finally:
+      os._exit(0)
+  return pid
+
+
+def serve(path, workers=4, maxprograms=64):
+  preload()
+  if os.path.exists(path):
+    os.unlink(path)
+  listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+  listener.bind(path)
+  os.chmod(path, 0o600)
+  listener.listen(64)
+
+  pool = set()
+  def shutdown(signum, frame):
+    raise SystemExit(0)
+  signal.signal(signal.SIGTERM, shutdown)
+  signal.signal(signal.SIGINT, shutdown)
+  try:
+    for _ in range(workers):
+      pool.add(spawn(listener, maxprograms))
+    print("serving on %s with %d workers" % (path, workers), file=sys.stderr)
+    while True:
+      pid, _ = os.wait()
+      if pid in pool:  # worker crashed, replace it
+        pool.discard(pid)
+        pool.add(spawn(listener, maxprograms))
+  finally:
+    for pid in pool:
+      try:
+        os.kill(pid, signal.SIGTERM)
+      except ProcessLookupError:
+        pass
+    listener.close()
+    os.unlink(path)
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser()
+  parser.add_argument('-s', '--socket', default=default_socket(),
+                      help="path to the socket (default: %(default)s)")
+  parser.add_argument('-w', '--workers', type=int, default=4,
+                      help="number of worker processes (default: %(default)s)")
+  parser.add_argument('--max-programs', type=int, default=64,
+                      help="compiled programs cached by each worker (default: %(default)s)")
+  args = parser.parse_args()
+  serve(args.socket, args.workers, args.max_programs)
@@ -1,12 +1,16 @@
 #!/usr/bin/env python3
 
 from log import logfilter
-from ast import parse, pretty_print
+from ast import parse, pretty_print, size
 from tokenizer import tokenize
 from indent import parse as indent_parse
-from interpreter import run
+from interpreter import run, report_caches
+from limits import Budget, BudgetExceeded
+from timings import phase, add_hook, Table, JsonLines
 import argparse
+import memo
 from sys import exit
+import sys
 
 if __name__ == '__main__':
   parser = argparse.ArgumentParser()
@@ -20,7 +24,31 @@ if __name__ == '__main__':
                       default=False, help="do not execute the program")
   parser.add_argument('-c', '--check-types', action='store_const', const=True,
                       default=False, help="perform type inference and checking (disabled by default)")
-  parser.add_argument('input', help="path to file")
+  parser.add_argument('--no-memo', action='store_const', const=True,
+                      default=False, help="do not memoize pure functions")
+  parser.add_argument('--stats', action='store_const', const=True,
+                      default=False, help="show memoization hits and misses")
+  parser.add_argument('--profile', action='store_const', const=True,
+                      default=False, help="show time spent in functions, calls, shell commands and regexes")
+  parser.add_argument('--profile-json', metavar='PATH',
+                      help="save profile as json (implies --profile)")
+  parser.add_argument('--sample', metavar='PATH',
+                      help="sample call stacks, write them to PATH in the folded format of flamegraph.pl (- for stdout)")
+  parser.add_argument('--sample-interval', type=float, default=1.0, metavar='MS',
+                      help="sampling interval in milliseconds (default: %(default)s)")
+  parser.add_argument('--timings', action='store_const', const=True,
+                      default=False, help="show time and memory spent in every phase")
+  parser.add_argument('--timings-json', metavar='PATH',
+                      help="write phase timings as json lines to PATH (- for stderr)")
+  parser.add_argument('--max-calls', type=int, metavar='N',
+                      help="stop after N function calls (exit code 3)")
+  parser.add_argument('--max-time', type=float, metavar='SEC',
+                      help="stop after SEC seconds of wall time (exit code 3)")
+  parser.add_argument('--max-shell', type=int, metavar='N',
+                      help="stop after N shell commands (exit code 3)")
+  parser.add_argument('--max-memory', type=float, metavar='MiB',
+                      help="stop when memory grows by more than MiB (exit code 3)")
+  parser.add_argument('input', nargs='?', help="path to file, starts interactive mode if omitted")
   parser.add_argument('cmd', nargs="*")
   args = parser.parse_args()
 
@@ -32,22 +60,84 @@ if __name__ == '__main__':
   if args.debug: logfilter.default = True
   else:          logfilter.default = False
 
+  table = None
+  if args.timings:
+    table = Table()
+    add_hook(table)
+  jsonfd = None
+  if args.timings_json:
+    if args.timings_json != '-':
+      jsonfd = open(args.timings_json, 'w')
+    add_hook(JsonLines(jsonfd or sys.stderr))
+
+  if not args.input:
+    from repl import main
+    main(['<repl>']+args.cmd)
+    if jsonfd: jsonfd.close()
+    exit(0)
+
   with open(args.input) as fd:
-    # split source into tokens
     src = fd.read()
+
+  # split source into tokens
+  with phase("tokenize") as p:
     tokens = tokenize(src)
-    if args.tokens:
-      print(tokens)
+    p.count(tokens=len(tokens))
+  if args.tokens:
+    print(tokens)
 
-    # parse indentation
+  # parse indentation
+  with phase("indent"):
     ast = indent_parse(tokens)
 
-    # finalize AST generation
+  # finalize AST generation
+  with phase("parse") as p:
     ast = parse(ast)
-    if args.ast:
-      pretty_print(ast)
+    p.count(nodes=lambda: size(ast))
+  if args.ast:
+    pretty_print(ast)
 
-    cmd = [args.input]+args.cmd
-    # run the program
-    if not args.dry_run:
-      exit(run(ast, cmd, check_types=args.check_types))
\ No newline at end of file
+  cmd = [args.input]+args.cmd
+  rc = 0
+  # run the program
+  if not args.dry_run:
+    budget = None
+    if any(x is not None for x in (args.max_calls, args.max_time, args.max_shell, args.max_memory)):
+      budget = Budget(calls=args.max_calls, seconds=args.max_time, shells=args.max_shell,
+                      memory=args.max_memory and int(args.max_memory * 2**20))
+    profiler = None
+    if args.profile or args.profile_json:
+      from profiler import Profiler
+      profiler = Profiler()
+    sampler = None
+    if args.sample:
+      from profiler import Sampler
+      sampler = Sampler(args.sample_interval / 1000)
+    try:
+      with phase("run"):
+        rc = run(ast, cmd, check_types=args.check_types,
+                 memoize=not args.no_memo, profiler=profiler,
+                 budget=budget, sampler=sampler)
+    except BudgetExceeded as err:
+      print(err, file=sys.stderr)
+      rc = 3
+    finally:
+      if sampler:
+        sampler.report()
+        if args.sample == '-':
+          sampler.folded()
+        else:
+          sampler.dump(args.sample)
+      if profiler:
+        profiler.report()
+      if args.profile_json:
+        profiler.dump(args.profile_json)
+      if table:
+        table.print()
+    if args.stats:
+      memo.report()
+      report_caches()
+  elif table:
+    table.print()
+  if jsonfd: jsonfd.close()
+  exit(rc)
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Thin client for daemon.py, a drop-in replacement of dead.py for
+running scripts:
+
+  deadc.py script.ls arg1 arg2
+
+Falls back to dead.py when the daemon is not running or when
+dead.py options are given.
+"""
+
+from daemon import default_socket, recv_frame, STDOUT, STDERR, EXIT
+import signal
+import socket
+import struct
+import json
+import os
+import sys
+
+DEAD = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dead.py")
+
+
+def fallback(argv):
+  os.execv(sys.executable, [sys.executable, DEAD] + argv)
+
+
+def main(argv):
+  if not argv or argv[0].startswith("-"):
+    fallback(argv)
+  sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+  try:
+    sock.connect(default_socket())
+  except (FileNotFoundError, ConnectionRefusedError):
+    fallback(argv)
+
+  req = {"script": argv[0], "argv": argv[1:],
+         "env": dict(os.environ), "cwd": os.getcwd()}
+  sock.sendall(json.dumps(req).encode())
+  sock.shutdown(socket.SHUT_WR)
+  streams = {STDOUT: sys.stdout.buffer, STDERR: sys.stderr.buffer}
+  while True:
+    kind, payload = recv_frame(sock)
+    if kind == EXIT:
+      return struct.unpack("!i", payload)[0]
+    try:
+      streams[kind].write(payload)
+      streams[kind].flush()
+    except BrokenPipeError:  # e.g., deadc.py script.ls | head
+      sock.close()  # the daemon kills the worker
+      os.dup2(os.open(os.devnull, os.O_WRONLY), streams[kind].fileno())
+      return 128 + signal.SIGPIPE
+
+
+if __name__ == '__main__':
+  sys.exit(main(sys.argv[1:]))
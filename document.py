@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Incremental parsing for editors.
+A document keeps tokens of every line and splits the source into
+top-level chunks: a line without indentation and all indented lines
+after it. An edit re-tokenizes only the changed lines and re-parses
+only chunks whose text changed, the other chunks keep their subtrees.
+"""
+
+from tokenizer import tokenize_line, get_indent
+from indent import parse as indent_parse
+from ast import Block, parse, walk, positions
+from log import Log
+log = Log("document")
+
+
+class Chunk:
+  def __init__(self, start, text, tree, error=None):
+    self.start = start  # number of the first line, 0-based
+    self.text = text
+    self.tree = tree    # parsed expressions of the chunk
+    self.error = error  # syntax error, the tree is empty then
+
+  def __repr__(self):
+    return "Chunk(start=%s, %s)" % (self.start, self.tree)
+
+
+class Document:
+  def __init__(self, text=""):
+    self.lines = text.split("\n")
+    self.tokens = [None] * len(self.lines)  # per-line token caches
+    self.chunks = []
+    self.reparsed = 0  # chunks parsed by the last update, for stats
+    self.update()
+
+  @property
+  def text(self):
+    return "\n".join(self.lines)
+
+  def edit(self, start_line, start_col, end_line, end_col, text):
+    """ Replaces text between two positions (0-based, end is
+        exclusive) and returns the updated AST.
+    """
+    head = self.lines[start_line][:start_col]
+    tail = self.lines[end_line][end_col:]
+    new = (head + text + tail).split("\n")
+    return self.replace_lines(start_line, end_line+1, new)
+
+  def replace_lines(self, start, end, lines):
+    """ Replaces lines [start, end) with the given ones. """
+    self.lines[start:end] = lines
+    self.tokens[start:end] = [None] * len(lines)
+    return self.update()
+
+  def spans(self):
+    """ Yields (start, end) lines of top-level chunks. """
+    start = 0
+    for i, l in enumerate(self.lines):
+      if i > start and l and not l[0].isspace():
+        yield start, i
+        start = i
+    if self.lines:
+      yield start, len(self.lines)
+
+  def update(self):
+    old = {}
+    for chunk in self.chunks:
+      old.setdefault(chunk.text, []).append(chunk)
+
+    chunks = []
+    self.reparsed = 0
+    for start, end in self.spans():
+      text = "\n".join(self.lines[start:end])
+      reuse = old.get(text)
+      if reuse:
+        chunk = reuse.pop()
+        if chunk.start != start:
+          shift(chunk.tree, start - chunk.start)
+          chunk.start = start
+      else:
+        try:
+          chunk = Chunk(start, text, self.parse_chunk(start, end))
+        except Exception as err:  # keep the rest of the document usable
+          chunk = Chunk(start, text, [], err)
+        self.reparsed += 1
+      chunks.append(chunk)
+    self.chunks = chunks
+    log.update("re-parsed", self.reparsed, "of", len(chunks), "chunks")
+    return self.ast
+
+  def parse_chunk(self, start, end):
+    tokens = []
+    for i in range(start, end):
+      if self.tokens[i] is None:
+        self.tokens[i] = tokenize_line(self.lines[i], i+1)
+      else:  # lines above could have been inserted or removed
+        for t in self.tokens[i]:
+          if not isinstance(t, str):
+            t.lineno = i+1
+      tokens += self.tokens[i]
+    if not tokens:
+      return []
+    return list(parse(indent_parse(tokens)))
+
+  @property
+  def errors(self):
+    """ List of (line, error) for chunks that cannot be parsed. """
+    return [(chunk.start, chunk.error) for chunk in self.chunks if chunk.error]
+
+  @property
+  def ast(self):
+    """ AST of the whole document. Subtrees of unchanged chunks are
+        shared between versions, so pass a copy to code that rewrites
+        the tree in place (e.g., interpreter.run).
+    """
+    exprs = []
+    for chunk in self.chunks:
+      exprs += chunk.tree
+    return positions(Block(*exprs), 0)
+
+
+def shift(tree, delta):
+  """ Moves line numbers of all nodes in the subtrees. """
+  for expr in tree:
+    for node in walk(expr):
+      if getattr(node, "lineno", None) is not None:
+        node.lineno += delta
+
+
+if __name__ == '__main__':
+  from log import logfilter
+  from ast import pretty_print
+  logfilter.default = False
+  doc = Document("f = (x) -> x + 1\nmain = (argc, argv) ->\n  f 1")
+  doc.edit(0, 15, 0, 16, "2")
+  print("re-parsed %s of %s chunks" % (doc.reparsed, len(doc.chunks)))
+  pretty_print(doc.ast)
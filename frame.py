@@ -1,10 +1,47 @@
 #!/usr/bin/env python3
 
 class Frame:
+  __slots__ = ('dict', 'parent', 'depth', 'pinned')
+  created = 0   # number of frames ever created, for statistics
+  pool = []     # released frames, see acquire() and release()
+  maxpool = 1024
+
   def __init__(self, parent=None):
+    Frame.created += 1
     self.dict = {}
     self.parent = parent
     self.depth = (self.parent.depth + 1) if self.parent else 0
+    self.pinned = False
+
+  @staticmethod
+  def acquire(parent):
+    """ A child frame of parent, reused from the pool if possible.
+        Give it back with release() when nothing refers to it.
+    """
+    pool = Frame.pool
+    if pool:
+      frame = pool.pop()
+      frame.parent = parent
+      frame.depth = parent.depth + 1
+      return frame
+    return Frame(parent)
+
+  def pin(self):
+    """ Keeps the frame and its parents out of the pool, for
+        values that evaluate code in them later (lazy sequences).
+    """
+    frame = self
+    while frame and not frame.pinned:
+      frame.pinned = True
+      frame = frame.parent
+
+  def release(self):
+    if self.pinned:
+      return
+    self.dict.clear()
+    self.parent = None
+    if len(Frame.pool) < Frame.maxpool:
+      Frame.pool.append(self)
 
   def update(self, d):
     self.dict.update(d)
@@ -32,34 +32,48 @@ def merge_dents(tokens):
 
 
 def blocks(it, lvl=0):
+  """ Groups tokens into nested blocks by indentation. Enclosing
+      blocks are kept on an explicit stack, so nesting is not
+      limited by the recursion limit.
+  """
+  stack = []  # (lvl, expr, blk) of enclosing blocks
   cur = lvl
   expr = Expr()
   blk = Block(expr)
-  prefix = str(lvl)+" "*(lvl-1)
   for t in it:
-    log.indent(prefix, "considering", t)
+    log.indent(lvl, "considering", t)
     if isinstance(t, DENT):
       cur = t.value
       if cur == lvl and expr:
-        log.indent(prefix, "got newline, starting new expr")
+        log.indent(lvl, "got newline, starting new expr")
         expr = Expr()
         blk.append(expr)
         continue
       elif cur > lvl:
-        log.indent(prefix, ">>> calling nested block")
-        r, cur = blocks(it, cur)
-        log.indent(prefix, "<<< got %s from it with level %s" % (r, cur))
-        expr.append(r)
-        if cur == lvl:
-          log.indent(prefix, "!!! starting new expression")
-          expr = Expr()
-          blk.append(expr)
+        log.indent(lvl, ">>> entering nested block")
+        stack.append((lvl, expr, blk))
+        lvl = cur
+        expr = Expr()
+        blk = Block(expr)
+        continue
     else:
-      log.indent(prefix, "adding %s to expr %s" % (t,expr))
+      log.indent(lvl, "adding", t, "to expr", expr)
       expr.append(t)
-    if cur < lvl:
-        log.indent(prefix, "<== %s < %s: time to return" % (cur, lvl))
+    while cur < lvl:
+      log.indent(lvl, "<==", cur, "<", lvl, ": closing block")
+      if not stack:
         return blk, cur
+      r = blk
+      lvl, expr, blk = stack.pop()
+      expr.append(r)
+      if cur == lvl:
+        log.indent(lvl, "!!! starting new expression")
+        expr = Expr()
+        blk.append(expr)
+  while stack:  # end of input closes all blocks
+    r = blk
+    lvl, expr, blk = stack.pop()
+    expr.append(r)
   return blk, lvl
 
 
@@ -1,15 +1,23 @@
-from ast import Node, ListNode, Unary, Binary, Leaf, rewrite
+from ast import Node, ListNode, Unary, Binary, Leaf, rewrite, walk, size
 from collections import OrderedDict
 from frame import Frame
+from timings import phase
 from log import Log
+from memo import Memo, MISS
+from typeinfer import TCon, TVar, TFunc, TArray, TInt, TStr, TBool, TRegEx, \
+  Scheme, Checker, InferenceError, resolve
+import limits
+import memo
 import ast
 
-from subprocess import check_output
-import shlex
+from itertools import islice
+import sys
 import re
 
 log = Log("interpreter")
 astMap = OrderedDict()
+builtins = {'argc': TInt, 'argv': TArray(TStr)}  # types of names available to main()
+prelude = {}  # name -> Builtin, put into the top frame by run()
 
 
 class replaces:
@@ -25,10 +33,13 @@ class replaces:
 def replace_nodes(node, depth):
     for oldCls, newCls in astMap.items():  #may be it should do newCls = asMap(type(node))??
       if isinstance(node, oldCls):
-        log.replace("replacing %s (%s)" % (node, type(node)))
+        log.replace("replacing %s (%s)", node, type(node))
         if isinstance(node, Leaf):
-          return newCls(node.value)
-        return newCls(*node)
+          new = newCls(node.value)
+        else:
+          new = newCls(*node)
+        new.lineno = node.lineno
+        return new
     return node
 
 
@@ -36,36 +47,12 @@ def replace_nodes(node, depth):
 # BUILT-IN TYPES #
 ##################
 
-class Type:
-  args = None
-  ret  = None
-
-  def __init__(self, args, ret):
-    if isinstance(args, (list, tuple)):
-      args = [arg if not isinstance(arg, Type) else arg.ret for arg in args]
-    if isinstance(args, Type):
-      args = args.ret
-    if isinstance(ret, Type):
-      ret = ret.ret
-    self.args = args
-    self.ret  = ret
-
-  def __repr__(self):
-    if self.args:
-        return "(%s) -> %s" % (self.args, self.ret.__name__)
-    return self.ret.__name__
-
-  def __eq__(self, other):
-    return self.args == other.args \
-      and self.ret == other.ret
-
-
 class Value(Leaf):
   type = None
   """ Base class for values. """
 
-  def infer_type(self, frame):
-    self.type = Type(None, self.__class__)
+  def infer_type(self, env):
+    self.type = TCon(self.__class__.__name__)
     return self.type
 
   def eval(self, frame):
@@ -110,33 +97,97 @@ class Int(Value):
 
 @replaces(ast.Str)
 class Str(Value):
+  """ Value is the text with {name} placeholders, to_string()
+      substitutes them. Add builds a rope: the text of a long
+      concatenation is joined only when value is read, e.g., by
+      to_string(), comparison, regex matching or subscript.
+  """
+  small = 256  # shorter concatenations are joined right away, see bench/strings.py
+  placeholder = re.compile(r"\{([a-zA-Z\.]+)\}|\\[nt]")
+  escapes = {r'\n': '\n', r'\t': '\t'}
+
+  def __init__(self, value):
+    self.parts = None  # (left, right) of a concatenation that is not joined yet
+    self.length = len(value)
+    super().__init__(value)
+
+  @property
+  def value(self):
+    if self.parts is not None:
+      self.join()
+    return self._value
+
+  @value.setter
+  def value(self, value):
+    self._value = value
+
+  def join(self):
+    pieces = []
+    stack = [self]
+    while stack:
+      s = stack.pop()
+      if s.parts is None:
+        pieces.append(s._value)
+      else:
+        stack += reversed(s.parts)
+    self._value = "".join(pieces)
+    self.parts = None
+
   def to_string(self, frame):
     string = self.value
-    replace = {r'\n': '\n', r'\t': '\t'}
-    varnames = re.findall("\{([a-zA-Z\.]+)\}", string, re.M)
-    for name in varnames:
-        value = Var(name).eval(frame).to_string(frame)
-        string = string.replace("{%s}" % name, value)
-    for k,v in replace.items():
-      string = string.replace(k, v)
-    return string
+    if '{' not in string and '\\' not in string:
+      return string
+    def substitute(m):
+      name = m.group(1)
+      if name is None:
+        return self.escapes[m.group()]
+      return Var(name).eval(frame).to_string(frame)
+    return self.placeholder.sub(substitute, string)
+
+  def Add(self, right):
+    length = self.length + right.length
+    if length <= self.small:
+      return Str(self.value + right.value)
+    rope = Str("")
+    rope.parts = self, right
+    rope.length = length
+    return rope
+
+  def Subscript(self, idx):
+    return Str(self.value[idx.to_int()])
 
 
 @replaces(ast.ShellCmd)
 class ShellCmd(Str):
+  def infer_type(self, env):
+    self.type = TStr
+    return self.type
+
   def eval(self, frame):
+    from subprocess import check_output, TimeoutExpired  # imported on first use, most scripts never shell out
+    import shlex
     cmd = super().eval(frame).to_string(frame)
-    raw = check_output(shlex.split(cmd))
+    budget = limits.active
+    timeout = budget.shell() if budget else None
+    try:
+      raw = check_output(shlex.split(cmd), timeout=timeout)
+    except TimeoutExpired:
+      budget.exceeded('seconds', budget.max_seconds)
     return Str(raw.decode())
 
 
 @replaces(ast.Brackets)
 class Array(ListNode):
+  type = None
   def __init__(self, args):
     super().__init__(*args)
 
-  def infer_type(self, frame):
-    print("TODO: array does not support type inference")
+  def infer_type(self, env):
+    elem = env.fresh()
+    for x in self:
+      env.unify(elem, x.infer_type(env), self)
+    self.type = TArray(elem)
+    return self.type
 
   def to_string(self, frame):
     values = [x.eval(frame).to_string(frame) for x in self]
@@ -159,26 +210,71 @@ class Bool(Value):
 
 @replaces(ast.RegEx)
 class RegEx(Value):
-  def RegMatch(self, string):
+  def RegMatch(self, string, frame):
     m = re.match(self.value, string.to_string(frame))
     if not m:
       return Bool(False)
     groupdict = m.groupdict()
     if groupdict:
-      frame.update(groupdict) # TODO: frame not provided in args
+      frame.update({k: Str(v or "") for k, v in groupdict.items()})
     group = m.group()
     if group:
       return Str(group)
     return Bool(True)
 
 
+class Seq(Value):
+  """ Lazy sequence, value is a function that returns a new
+      iterator over the elements. The type checker does not
+      tell sequences from arrays, both are Array(a).
+  """
+  show = 10  # to_string() shows only the first elements
+
+  def __iter__(self):
+    return self.value()
+
+  def infer_type(self, env):
+    self.type = TArray(env.fresh())
+    return self.type
+
+  def to_string(self, frame):
+    values = []
+    for i, x in enumerate(self):
+      if i == self.show:
+        values.append("...")
+        break
+      values.append(x.to_string(frame))
+    return '[' + ", ".join(values) + ']'
+
+  def Subscript(self, idx):
+    i = idx.to_int()
+    for x in islice(self, i, i+1):
+      return x
+    raise IndexError("sequence index out of range: %s" % i)
+
+
+@replaces(ast.Range)
+class Range(Binary):
+  """ Inclusive range of integers, a lazy sequence. """
+  type = None
+  def infer_type(self, env):
+    env.unify(self.left.infer_type(env), TInt, self)
+    env.unify(self.right.infer_type(env), TInt, self)
+    self.type = TArray(TInt)
+    return self.type
+
+  def eval(self, frame):
+    start = self.left.eval(frame).to_int()
+    stop = self.right.eval(frame).to_int()
+    return Seq(lambda: map(Int, range(start, stop+1)))
+
+
 @replaces(ast.Id)
 class Var(Leaf):
   type = None
 
-  def infer_type(self, frame):
-    ref = frame[self.value]
-    self.type = ref.infer_type(frame)
+  def infer_type(self, env):
+    self.type = env.instantiate(self.value)
     return self.type
 
   def Assign(self, value, frame):
@@ -196,34 +292,101 @@ class Var(Leaf):
     return str(self.value)
 
 
+class CacheStats:
+  """ Hits and misses of inline caches, see dead.py --stats. """
+  def __init__(self, name):
+    self.name = name
+    self.hits = 0       # last seen types or function
+    self.misses = 0     # everything else, the counters below are part of it
+    self.poly_hits = 0  # types found in the polymorphic cache
+    self.megamorphic = 0  # lookups in nodes that have seen too many types
+
+  def __repr__(self):
+    return "CacheStats(%s)" % self.name
+
+binop_cache = CacheStats("binop")
+call_cache = CacheStats("call")
+inline_caches = [binop_cache, call_cache]
+
+
+def report_caches(file=sys.stderr):
+  print("%-10s %10s %10s %10s %12s" % ("cache", "hits", "misses", "poly hits", "megamorphic"), file=file)
+  for c in inline_caches:
+    print("%-10s %10s %10s %10s %12s" % (c.name, c.hits, c.misses, c.poly_hits, c.megamorphic), file=file)
+
+
 class BinOp(Binary):
   same_type_operands = True
   type = None
-  def infer_type(self, frame):
-    ltype = self.left.infer_type(frame)
-    rtype = self.right.infer_type(frame)
-    assert ltype == rtype, \
-      "left and right types should have the same type." \
-      " Got \"%s\" and \"%s\" respectively." % (ltype, rtype)
-    self.type = Type([ltype, rtype], ltype)
+  # inline cache: the method for the last seen operand types and
+  # a polymorphic table of up to max_poly type pairs
+  ic_left = ic_right = ic_method = ic_poly = None
+  max_poly = 4
+
+  def infer_type(self, env):
+    ltype = self.left.infer_type(env)
+    rtype = self.right.infer_type(env)
+    env.unify(ltype, rtype, self)
+    self.type = ltype
     return self.type
 
   def eval(self, frame):
-    opname = self.__class__.__name__
     left = self.left.eval(frame)
     right = self.right.eval(frame)
+    if type(left) is self.ic_left and type(right) is self.ic_right:
+      binop_cache.hits += 1
+      return self.ic_method(left, right)
+    return self.ic_miss(left, right)
+
+  def ic_miss(self, left, right):
+    binop_cache.misses += 1
+    key = type(left), type(right)
+    poly = self.ic_poly
+    method = poly.get(key) if poly else None
+    if method is not None:
+      binop_cache.poly_hits += 1
+    else:
+      method = self.lookup(left, right)
+      if self.ic_left is None:  # first evaluation, stay monomorphic
+        pass
+      elif poly is None:
+        poly = {(self.ic_left, self.ic_right): self.ic_method, key: method}
+      elif len(poly) < self.max_poly:
+        poly[key] = method
+      else:
+        binop_cache.megamorphic += 1
+        return method(left, right)
+    # bypass Node.__setattr__, these are not fields
+    d = self.__dict__
+    d['ic_left'], d['ic_right'] = key
+    d['ic_method'] = method
+    d['ic_poly'] = poly
+    return method(left, right)
+
+  def lookup(self, left, right):
+    """ The method that implements the operation for these operands. """
+    opname = self.__class__.__name__
     if self.same_type_operands and type(left) != type(right):
       raise Exception("%s:" \
       "left and right values should have the same type, " \
       "got\n %s \nand\n %s instead" % (self.__class__, left, right))
     assert hasattr(left, opname), \
       "%s (%s) does not support %s operation" % (left, type(left), opname)
-    return getattr(left, opname)(right)
+    return getattr(type(left), opname)
 
 
 @replaces(ast.Lambda0)
 class Func0(Node):
   fields = ['body']
+  type = None
+  name = None
+  names = ()
+  arity = 0
+
+  def infer_type(self, env):
+    with env as newenv:
+      self.type = TFunc([], self.body.infer_type(newenv))
+    return self.type
 
   def Call(self, frame):
     return self.body.eval(frame)
@@ -236,18 +399,51 @@ class Func0(Node):
 class Func(Node):
   fields = ['args', 'body']
   type = None
-
-  def infer_type(self, frame):
-    argtypes = []
-    for arg in self.args:
-      argtypes.append(arg.infer_type(frame))
-    body_t = self.body.infer_type(frame)
-    self.type = Type(argtypes, body_t)
+  name = None
+  pure = None  # None means "not analyzed yet", see analyze()
+  free = None
+  memo = None
+  names = None  # argument names
+  arity = None
+
+  def __init__(self, args, body):
+    super().__init__(args, body)
+    self.names = tuple(arg.value for arg in args)
+    self.arity = len(self.names)
+
+  def infer_type(self, env):
+    with env as newenv:
+      argtypes = []
+      for arg in self.args:
+        t = newenv.fresh()
+        newenv[arg.value] = Scheme([], t)
+        argtypes.append(t)
+      self.type = TFunc(argtypes, self.body.infer_type(newenv))
     return self.type
 
   def Call(self, frame):
     return self.body.eval(frame)
 
+  def memo_call(self, frame):
+    """ Like Call() but takes the result from the memo table
+        when the function is pure and was called with the same
+        arguments before.
+    """
+    if self.pure is None:
+      analyze(self)
+    if not self.pure:
+      return self.Call(frame)
+    key = call_key(self, frame)
+    if key is None:
+      return self.Call(frame)
+    if self.memo is None:
+      self.memo = Memo(self.name or "<lambda>")
+    r = self.memo.get(key)
+    if r is MISS:
+      r = self.Call(frame)
+      self.memo.put(key, r)
+    return r
+
   def eval(self, frame):
     return self
 
@@ -255,9 +451,10 @@ class Func(Node):
 @replaces(ast.Block)
 class Block(Node):
   type = None
-  def infer_type(self, frame):
+  def infer_type(self, env):
+    self.type = env.fresh()
     for expr in self:
-      self.type = expr.infer_type(frame)
+      self.type = expr.infer_type(env)
     return self.type  # last expression in the block is it's type :)
 
 
@@ -272,8 +469,8 @@ class Block(Node):
 class Print(Unary):
   fields = ['arg']
   type = None
-  def infer_type(self, frame):
-    self.type = self.arg.infer_type(frame)
+  def infer_type(self, env):
+    self.type = self.arg.infer_type(env)
     return self.type
 
   def eval(self, frame):
@@ -284,6 +481,12 @@ class Print(Unary):
 
 @replaces(ast.Assert)
 class Assert(Unary):
+  type = None
+  def infer_type(self, env):
+    self.type = self.arg.infer_type(env)
+    env.unify(self.type, TBool, self)
+    return self.type
+
   def eval(self, frame):
     r = self.arg.eval(frame)
     if not r:
@@ -295,17 +498,47 @@ class Assert(Unary):
 class RegMatch(BinOp):
   same_type_operands = False
   def __init__(self, left, right):
-    if isinstance(left, (Str, ast.Str)):
+    if isinstance(left, (Str, ast.Str)) or isinstance(right, (RegEx, ast.RegEx)):
       left, right = right, left
     super().__init__(left, right)
 
+  def eval(self, frame):
+    regex = self.left.eval(frame)
+    string = self.right.eval(frame)
+    return regex.RegMatch(string, frame)
+
+  def infer_type(self, env):
+    ltype = self.left.infer_type(env)
+    rtype = self.right.infer_type(env)
+    if isinstance(self.left, RegEx):
+      env.unify(rtype, TStr, self)
+    elif isinstance(self.right, RegEx):
+      env.unify(ltype, TStr, self)
+    else:
+      env.unify(ltype, TRegEx, self)
+      env.unify(rtype, TStr, self)
+    self.type = TBool
+    return self.type
+
 
 @replaces(ast.Assign)
 class Assign(BinOp):
+  def infer_type(self, env):
+    if not isinstance(self.left, Var):
+      raise InferenceError("cannot assign to %s" % self.left)
+    if isinstance(self.right, (Func, Func0)):
+      self.type = env.let(self.left.value, self.right)
+    else:
+      self.type = self.right.infer_type(env)
+      env[self.left.value] = Scheme([], self.type)
+    return self.type
+
   def eval(self, frame):
     value = self.right.eval(frame)
     # TODO: lvalue should be a valid ID
     self.left.Assign(value, frame)
+    if isinstance(value, (Func, Func0)) and not value.name:
+      value.name = self.left.value
     return value
 
 
@@ -317,16 +550,16 @@ class Mul(BinOp): pass
 
 @replaces(ast.Eq)
 class Eq(BinOp):
-  def infer_type(self, frame):
-    super().infer_type(frame)
-    self.type.ret = Bool
+  def infer_type(self, env):
+    super().infer_type(env)
+    self.type = TBool
     return self.type
 
 @replaces(ast.Less)
-class Less(BinOp): pass
+class Less(Eq): pass
 
 @replaces(ast.More)
-class More(BinOp): pass
+class More(Eq): pass
 
 @replaces(ast.Sub)
 class Sub(BinOp): pass
@@ -337,16 +570,164 @@ class Pow(BinOp): pass
 @replaces(ast.Subscript)
 class Subscript(BinOp):
   same_type_operands = False
+  def infer_type(self, env):
+    elem = env.fresh()
+    env.unify(self.left.infer_type(env), TArray(elem), self)
+    env.unify(self.right.infer_type(env), TInt, self)
+    self.type = elem
+    return self.type
+
+
+##########################
+# TYPE-SPECIALIZED NODES #
+##########################
+
+specialized_cache = CacheStats("special")
+inline_caches.append(specialized_cache)
+
+
+def new(cls, value):
+  """ A value without running __init__, the value is already converted. """
+  v = cls.__new__(cls)
+  v.value = value
+  return v
+
+
+class Guarded:
+  """ Base of nodes specialized for operand types proven by the checker.
+      They read operands by index instead of Node.__getattr__ and
+      compute the result without method lookup. Operands are still
+      checked with a cheap type test: if it fails the node is turned
+      back into the generic one for good.
+  """
+  generic = None  # the class of the generic node
+
+  def guard_failed(self, left, right):
+    specialized_cache.misses += 1
+    self.__class__ = self.generic
+    return self.ic_miss(left, right)
+
+
+class IntAdd(Guarded, Add):
+  generic = Add
+  def eval(self, frame):
+    left = self[0].eval(frame)
+    right = self[1].eval(frame)
+    if type(left) is Int and type(right) is Int:
+      specialized_cache.hits += 1
+      return new(Int, left.value + right.value)
+    return self.guard_failed(left, right)
+
+
+class IntSub(Guarded, Sub):
+  generic = Sub
+  def eval(self, frame):
+    left = self[0].eval(frame)
+    right = self[1].eval(frame)
+    if type(left) is Int and type(right) is Int:
+      specialized_cache.hits += 1
+      return new(Int, left.value - right.value)
+    return self.guard_failed(left, right)
+
+
+class IntMul(Guarded, Mul):
+  generic = Mul
+  def eval(self, frame):
+    left = self[0].eval(frame)
+    right = self[1].eval(frame)
+    if type(left) is Int and type(right) is Int:
+      specialized_cache.hits += 1
+      return new(Int, left.value * right.value)
+    return self.guard_failed(left, right)
+
+
+class IntEq(Guarded, Eq):
+  generic = Eq
+  def eval(self, frame):
+    left = self[0].eval(frame)
+    right = self[1].eval(frame)
+    if type(left) is Int and type(right) is Int:
+      specialized_cache.hits += 1
+      return new(Bool, left.value == right.value)
+    return self.guard_failed(left, right)
+
+
+class IntLess(Guarded, Less):
+  generic = Less
+  def eval(self, frame):
+    left = self[0].eval(frame)
+    right = self[1].eval(frame)
+    if type(left) is Int and type(right) is Int:
+      specialized_cache.hits += 1
+      return new(Bool, left.value < right.value)
+    return self.guard_failed(left, right)
+
+
+class IntMore(Guarded, More):
+  generic = More
+  def eval(self, frame):
+    left = self[0].eval(frame)
+    right = self[1].eval(frame)
+    if type(left) is Int and type(right) is Int:
+      specialized_cache.hits += 1
+      return new(Bool, left.value > right.value)
+    return self.guard_failed(left, right)
+
+
+class StrEq(Guarded, Eq):
+  generic = Eq
+  def eval(self, frame):
+    left = self[0].eval(frame)
+    right = self[1].eval(frame)
+    if type(left) is Str and type(right) is Str:
+      specialized_cache.hits += 1
+      return new(Bool, left.value == right.value)
+    return self.guard_failed(left, right)
+
+
+# (generic node, operand type) -> specialized node
+specializations = {
+  (Add, TInt): IntAdd, (Sub, TInt): IntSub, (Mul, TInt): IntMul,
+  (Eq, TInt): IntEq, (Less, TInt): IntLess, (More, TInt): IntMore,
+  (Eq, TStr): StrEq,
+}
+
+
+def specialize(tree):
+  """ Replaces binary operations whose operand type the checker
+      proved (no type variables left) with specialized nodes.
+      Returns the number of replaced nodes.
+  """
+  replaced = 0
+  for node in walk(tree):
+    if not isinstance(node, BinOp) or node.left.type is None:
+      continue
+    special = specializations.get((type(node), resolve(node.left.type)))
+    if special:
+      node.__class__ = special
+      replaced += 1
+  return replaced
 
 
 @replaces(ast.Parens)
 class Parens(Unary):
+  type = None
+  def infer_type(self, env):
+    self.type = self.arg.infer_type(env)
+    return self.type
+
   def eval(self, frame):
     return self.arg.eval(frame)
 
 
 @replaces(ast.IfThen)
 class IfThen(ast.IfThen):
+  type = None
+  def infer_type(self, env):
+    env.unify(self.iff.infer_type(env), TBool, self)
+    self.type = self.then.infer_type(env)
+    return self.type
+
   def eval(self, frame):
     if self.iff.eval(frame):  # this should return Bool
       return True, self.then.eval(frame)
@@ -356,12 +737,10 @@ class IfThen(ast.IfThen):
 @replaces(ast.IfElse)
 class IfElse(ast.IfElse):
   type = None
-  def infer_type(self, frame):
-    assert self.iff.infer_type(frame).ret == Bool
-    then_type = self.then.infer_type(frame)
-    else_type = self.otherwise.infer_type(frame)
-    assert then_type == else_type
-    self.type = Type(Bool, else_type)
+  def infer_type(self, env):
+    env.unify(self.iff.infer_type(env), TBool, self)
+    self.type = self.then.infer_type(env)
+    env.unify(self.type, self.otherwise.infer_type(env), self)
     return self.type
 
   def eval(self, frame):
@@ -370,16 +749,189 @@ class IfElse(ast.IfElse):
     return self.otherwise.eval(frame)
 
 
+# hits are arms found by a jump table, misses are lookups that fell through
+dispatch_cache = CacheStats("dispatch")
+inline_caches.append(dispatch_cache)
+
+
 @replaces(ast.Match)
 class Match(Unary):
-  def eval(self, frame):
+  type = None
+  plan = None     # built on the first eval, see dispatch_plan()
+  min_table = 3   # fewer arms are not worth a jump table
+
+  def infer_type(self, env):
+    self.type = env.fresh()
     for expr in self.arg:
-      assert isinstance(expr, IfThen), \
-        "Child nodes of match operator can" \
-        "only be instances of IfThen"
-      match, result = expr.eval(frame)
-      if match:
-        return result
+      env.unify(self.type, expr.infer_type(env), self)
+    return self.type
+
+  def eval(self, frame):
+    plan = self.plan
+    if plan is None:
+      plan = self.plan = dispatch_plan(self.arg, self.min_table)
+    for step in plan:
+      if isinstance(step, JumpTable):
+        arm = step.lookup(frame)
+        if arm is not None:
+          dispatch_cache.hits += 1
+          return arm.then.eval(frame)
+        dispatch_cache.misses += 1
+      elif step.iff.eval(frame):
+        return step.then.eval(frame)
+
+
+class JumpTable:
+  """ Consecutive match arms "key == literal" with the same pure key
+      and literals of the same type. The key is evaluated once and
+      the first arm with the equal literal is found by hashing.
+  """
+  def __init__(self, key, type):
+    self.key = key
+    self.type = type
+    self.arms = []
+    self.table = {}  # literal value -> first arm with it
+
+  def add(self, arm, literal):
+    self.arms.append(arm)
+    self.table.setdefault(literal.value, arm)
+
+  def lookup(self, frame):
+    value = self.key.eval(frame)
+    if type(value) is self.type:
+      return self.table.get(value.value)
+    # other types: evaluate arms in order, it raises the same errors
+    for arm in self.arms:
+      if arm.iff.eval(frame):
+        return arm
+    return None
+
+
+class RegexTable(JumpTable):
+  """ Consecutive match arms "key =~ /regex/" with the same pure key.
+      The regexes are combined into one alternation with a named
+      group per arm, so the key is scanned once and the first
+      matching arm is found by the name of the matched group.
+  """
+  group_name = re.compile(r"\(\?P([<=])(\w+)")
+  # patterns that change meaning inside an alternation: numbered
+  # backreferences, conditionals and global flags
+  uncombinable = re.compile(r"\\[1-9]|\(\?\(|\(\?[aiLmsux]+\)")
+
+  def __init__(self, key, type):
+    super().__init__(key, type)
+    self.patterns = []
+    self.pattern = None  # compiled on the first lookup
+    self.groups = {}     # arm group name -> [(renamed group, group name in the regex)]
+
+  def add(self, arm, regex):
+    self.arms.append(arm)
+    self.patterns.append(regex.value)
+
+  def compile(self):
+    parts = []
+    for i, pattern in enumerate(self.patterns):
+      name = "_arm%d" % i
+      renamed = lambda m: "(?P%s%s_%s" % (m.group(1), name, m.group(2))
+      parts.append("(?P<%s>%s)" % (name, self.group_name.sub(renamed, pattern)))
+      self.groups[name] = [("%s_%s" % (name, g), g) for g in re.compile(pattern).groupindex]
+    return re.compile("|".join(parts))
+
+  def lookup(self, frame):
+    if self.pattern is None:
+      self.pattern = self.compile()
+    m = self.pattern.match(self.key.eval(frame).to_string(frame))
+    if not m:
+      return None
+    name = m.lastgroup
+    for group, var in self.groups[name]:
+      frame[var] = Str(m.group(group) or "")
+    return self.arms[int(name[4:])]
+
+
+def generic_type(node):
+  """ Class of the node as translate() built it, for the nodes
+      specialized by the type checker (see Guarded) or instrumented
+      by the profilers (see profiler.Instrumenter).
+  """
+  return getattr(type(node), 'generic', None) or type(node)
+
+
+def pure_expr(node):
+  """ True if evaluating the node twice gives the same value and no side effects. """
+  if isinstance(node, Var) or type(node) in (Int, Str):
+    return True
+  if generic_type(node) in (Parens, Subscript, Add, Sub, Mul):
+    return all(pure_expr(n) for n in node)
+  return False
+
+
+def table_arm(arm):
+  """ Returns (key, literal) if the arm is "key == literal", else None. """
+  cond = arm.iff
+  if generic_type(cond) is not Eq:
+    return None
+  for key, literal in ((cond.left, cond.right), (cond.right, cond.left)):
+    if type(literal) in (Int, Str) and pure_expr(key):
+      return key, literal
+  return None
+
+
+def regex_arm(arm):
+  """ Returns (key, regex) if the arm is "key =~ /regex/", else None. """
+  cond = arm.iff
+  if generic_type(cond) is not RegMatch or type(cond.left) is not RegEx:
+    return None
+  if not pure_expr(cond.right) or RegexTable.uncombinable.search(cond.left.value):
+    return None
+  try:
+    re.compile(cond.left.value)
+  except re.error:
+    return None  # let the arm raise the error when it is evaluated
+  return cond.right, cond.left
+
+
+def dispatch_plan(arms, min_table):
+  """ Splits arms into steps: single arms tried in order, jump tables
+      and combined regexes.
+  """
+  plan = []
+  table = None
+  for arm in arms:
+    assert isinstance(arm, IfThen), \
+      "Child nodes of match operator can" \
+      "only be instances of IfThen"
+    entry = table_arm(arm)
+    if entry:
+      key, literal = entry
+      if type(table) is JumpTable and type(literal) is table.type and repr(key) == repr(table.key):
+        table.add(arm, literal)
+        continue
+      table = JumpTable(key, type(literal))
+      table.add(arm, literal)
+      plan.append(table)
+      continue
+    entry = regex_arm(arm)
+    if entry:
+      key, regex = entry
+      if type(table) is RegexTable and repr(key) == repr(table.key):
+        table.add(arm, regex)
+        continue
+      table = RegexTable(key, RegEx)
+      table.add(arm, regex)
+      plan.append(table)
+    else:
+      table = None
+      plan.append(arm)
+  # short runs are cheaper to test one by one
+  steps = []
+  for step in plan:
+    if isinstance(step, JumpTable) and len(step.arms) < min_table:
+      steps += step.arms
+    else:
+      steps.append(step)
+  log.dispatch("match plan:", steps)
+  return steps
 
 
 ###########
@@ -390,18 +942,31 @@ class ReturnException(Exception):  pass
 
 @replaces(ast.Return)
 class Return(Leaf):
+  type = None
+  def infer_type(self, env):
+    self.type = env.fresh()
+    return self.type
+
   def eval(self, frame):
     raise ReturnException
 
 
 @replaces(ast.AlwaysTrue)
 class AlwaysTrue(Value):
+  def infer_type(self, env):
+    self.type = TBool
+    return self.type
+
   def Bool(self, frame):
     return Bool(True)
 
 
 @replaces(ast.Comment)
 class Comment(Value):
+  def infer_type(self, env):
+    self.type = env.fresh()
+    return self.type
+
   def eval(self, frame):
     pass
 
@@ -412,72 +977,524 @@ class Comment(Value):
 
 @replaces(ast.Call0)
 class Call0(Unary):
+  type = None
+  def infer_type(self, env):
+    self.type = env.fresh()
+    env.unify(self.arg.infer_type(env), TFunc([], self.type), self)
+    return self.type
+
   def eval(self, frame):
-    with frame as newframe:
-      func = self.arg.eval(newframe)
-      return func.Call(newframe)
+    return call_function(self.arg.eval(frame), frame, ())
+
+
+def call_function(func, frame, values, run=None):
+  """ Calls the function with evaluated arguments. The new frame
+      is a child of the caller's one (scoping is dynamic), it is
+      taken from the pool and returned there after the call.
+      run is the method that runs the call, see call_method().
+  """
+  if values and len(values) != func.arity:
+    raise Exception("%s takes %s arguments, got %s" % (func.name or "function", func.arity, len(values)))
+  if limits.active:
+    limits.active.call()
+  if run is None:
+    run = call_method(func)
+  newframe = Frame.acquire(frame)
+  try:
+    if values:
+      newframe.dict.update(zip(func.names, values))
+    return run(newframe)
+  finally:
+    newframe.release()
+
+
+def call_method(func):
+  """ The memoized path for pure functions, Call() for the rest. """
+  if memo.enabled and isinstance(func, Func):
+    if func.pure is None:
+      analyze(func)
+    if func.pure:
+      return func.memo_call
+  return func.Call
+
+
+def infer_call(env, func, args, node):
+  """ Type of a function application, args is either a single
+      argument or an array of them (see Call.eval).
+  """
+  ftype = func.infer_type(env)
+  if isinstance(args, Array):
+    argtypes = [arg.infer_type(env) for arg in args]
+  else:
+    argtypes = [args.infer_type(env)]
+  ret = env.fresh()
+  env.unify(ftype, TFunc(argtypes, ret), node)
+  return ret
 
 
 @replaces(ast.Call)
 class Call(Binary):
   fields = ['func', 'args']
+  type = None
+  # inline cache: the last called function and the method that runs
+  # it (see call_method), valid while memoization is not switched
+  ic_func = ic_run = ic_memo = None
+
+  def infer_type(self, env):
+    self.type = infer_call(env, self.func, self.args, self)
+    return self.type
+
   def eval(self, frame):
-    with frame as newframe:
-      func = self.func.eval(frame)
-      args = self.args.eval(frame)
-      if isinstance(args, (Value, Var)):
-        """ this is just to be able to iterate over func
-            args
-        """
-        args = [args]
-      assert len(func.args) == len(args)
-      for k, v in zip(func.args, args):
-        v =v.eval(frame)  # TODO: Why need extra eval??
-        if isinstance(v, ast.Int): v = Int(v.value) # dirty hack to overcome parser bug
-        newframe[k.value] = v
-      return func.Call(newframe)
+    func = self.func.eval(frame)
+    args = self.args
+    if type(args) is Array:  # f a, b
+      values = [arg.eval(frame) for arg in args]
+    else:
+      values = spread(func, args.eval(frame), frame)
+    if func is self.ic_func and self.ic_memo is memo.enabled:
+      call_cache.hits += 1
+      run = self.ic_run
+    else:
+      call_cache.misses += 1
+      run = call_method(func)
+      self.__dict__.update(ic_func=func, ic_run=run, ic_memo=memo.enabled)  # not fields, skip Node.__setattr__
+    return call_function(func, frame, values, run)
+
+
+def spread(func, value, frame):
+  """ Arguments given as one value: a scalar is the only
+      argument, an array is spread over the arguments unless
+      the function takes one (e.g., count xs).
+  """
+  if func.arity == 1 or isinstance(value, (Value, Var)):
+    return [value]
+  return [v.eval(frame) for v in value]
+
+
+##########
+# PURITY #
+##########
+
+def analyze(func):
+  """ Finds out whether the function body is free of side
+      effects (shell commands, printing, regex group binding)
+      and which names it takes from the outer frames.
+  """
+  pure = True
+  for node in walk(func):
+    if isinstance(node, (ShellCmd, Print, RegMatch)):
+      pure = False
+    elif isinstance(node, Assign) and not isinstance(node.left, Var):
+      pure = False
+  free = set()
+  free_reads(func.body, frozenset(func.names), free)
+  func.pure = pure
+  func.free = tuple(sorted(free))
+  log.purity(func.name, "pure" if pure else "impure", "free:", func.free)
+  return pure
+
+
+def free_reads(node, bound, free):
+  """ Adds to free the names the node can read before they are
+      bound in the frame of the call, returns the names that are
+      bound after it is evaluated. Scoping is dynamic, so a name
+      assigned only later or on some paths is taken from the
+      caller's frame until then.
+  """
+  if isinstance(node, Var):
+    if node.value not in bound:
+      free.add(node.value)
+    return bound
+  if isinstance(node, Assign):
+    bound = free_reads(node.right, bound, free)
+    if isinstance(node.left, Var):
+      return bound | {node.left.value}
+    return free_reads(node.left, bound, free)
+  if isinstance(node, (Func, Func0)):
+    # the body runs in its own frame, on top of the names bound by now
+    free_reads(node.body, bound | set(node.names), free)
+    return bound
+  if isinstance(node, IfThen):
+    # the arm may not be taken, names bound in it are not counted
+    free_reads(node.then, free_reads(node.iff, bound, free), free)
+    return bound
+  if isinstance(node, IfElse):
+    bound = free_reads(node.iff, bound, free)
+    free_reads(node.then, bound, free)
+    free_reads(node.otherwise, bound, free)
+    return bound
+  if isinstance(node, Node):
+    for child in node:
+      bound = free_reads(child, bound, free)
+  return bound
+
+
+def is_pure(func, frame, seen):
+  """ Checks that the function and all functions it refers
+      to by name are pure.
+  """
+  if isinstance(func, Func0):
+    return False
+  if func.pure is None:
+    analyze(func)
+  if not func.pure:
+    return False
+  if id(func) in seen:
+    return True
+  seen.add(id(func))
+  for name in func.free:
+    try:
+      value = frame[name]
+    except KeyError:
+      return False
+    if isinstance(value, (Func, Func0)) and not is_pure(value, frame, seen):
+      return False
+  return True
+
+
+def value_key(value, frame, seen):
+  """ Hashable representation of a value or None if the value
+      cannot be a part of a memo key.
+  """
+  cls = generic_type(value)
+  if cls is Str and value.parts is not None:
+    return None  # joining a rope for the key would make appends quadratic
+  if cls in (Int, Str, Bool):
+    return cls, value.value
+  if cls is Array:
+    keys = tuple(value_key(x, frame, seen) for x in value)
+    if None in keys:
+      return None
+    return cls, keys
+  if cls is Func and is_pure(value, frame, seen):
+    return cls, id(value)
+  return None
+
+
+def call_key(func, frame):
+  """ Memo key for a call: values of the arguments and of all
+      the outer names the function refers to (scoping is dynamic),
+      also through the functions it gets from the outer frames.
+  """
+  seen = {id(func)}
+  key = []
+  names = list(func.names + func.free)
+  funcs = {id(func)}
+  for name in names:  # grows while iterating
+    try:
+      value = frame[name]
+    except KeyError:
+      return None
+    k = value_key(value, frame, seen)
+    if k is None:
+      return None
+    key.append(k)
+    if generic_type(value) is Func and id(value) not in funcs:
+      funcs.add(id(value))
+      names += [n for n in value.free if n not in names]
+  return tuple(key)
 
 
 ##########################
 # Higher-Order Functions #
 ##########################
 
+class Composition(Value):
+  """ Functions applied one after another, value is the tuple of
+      them in the order of application. Calling it calls them
+      directly, no nodes are built.
+  """
+  names = None
+  arity = None
+  name = "<composition>"
+
+  def __init__(self, funcs):
+    flat = []
+    for f in funcs:
+      if not is_function(f):
+        raise Exception("cannot compose %s, it is not a function" % (f,))
+      flat += f.value if isinstance(f, Composition) else [f]
+    super().__init__(tuple(flat))
+    self.names = flat[0].names
+    self.arity = flat[0].arity
+
+  def Call(self, frame):
+    caller = frame.parent
+    first = self.value[0]
+    r = call_function(first, caller, [frame[name] for name in self.names])
+    for f in self.value[1:]:
+      r = call_function(f, caller, [r])
+    return r
+
+  def to_string(self, frame):
+    return "<composition of %s functions>" % len(self.value)
+
+
+def is_function(value):
+  return isinstance(value, (Func, Func0, Builtin, Composition))
+
+
+class Compose(Binary):
+  """ Base of the composition operators. Compositions are cached
+      while the node sees the same functions.
+  """
+  type = None
+  ic_first = ic_then = ic_composition = None
+
+  def compose(self, first, then):
+    if first is self.ic_first and then is self.ic_then:
+      return self.ic_composition
+    composition = Composition([first, then])
+    self.__dict__.update(ic_first=first, ic_then=then, ic_composition=composition)
+    return composition
+
+  def apply(self, func, operand, value, frame):
+    """ f . xs maps f lazily over an array or a sequence, f . a, b
+        (the operand is the literal itself) calls f with a and b.
+    """
+    if isinstance(value, Seq) or (isinstance(value, Array) and value is not operand):
+      return lazy_map(func, value, frame)
+    return call_function(func, frame, spread(func, value, frame))
+
+  def infer_compose(self, env, first, then):
+    """ Type of applying then to the result of first if first is
+        a function, else to first itself (see eval of the operators).
+    """
+    if type(first) is Array:  # f . a, b
+      return infer_call(env, then, first, self)
+    ftype = first.infer_type(env)
+    ttype = then.infer_type(env)
+    ret = env.fresh()
+    t = ftype.find() if isinstance(ftype, TVar) else ftype
+    if isinstance(t, TCon) and t.name == 'Func':
+      env.unify(ttype, TFunc([t.args[-1]], ret), self)
+      return TFunc(t.args[:-1], ret)
+    if isinstance(t, TCon) and t.name == 'Array':  # mapped lazily
+      env.unify(ttype, TFunc([t.args[0]], ret), self)
+      return TArray(ret)
+    env.unify(ttype, TFunc([ftype], ret), self)
+    return ret
+
+
 @replaces(ast.ComposeR)
-class ComposeR(Binary):
+class ComposeR(Compose):
+  """ f . g is a function that applies g and then f, f . x is f x. """
+  def infer_type(self, env):
+    self.type = self.infer_compose(env, self.right, self.left)
+    return self.type
+
   def eval(self, frame):
     right = self.right.eval(frame)
     left = self.left.eval(frame)
-    return Call(left, right).eval(frame)
+    if is_function(right):
+      return self.compose(right, left)
+    return self.apply(left, self.right, right, frame)
 
 
+@replaces(ast.ComposerL)
+class ComposerL(Compose):
+  """ f $ g is a function that applies f and then g, x $ f is f x. """
+  def infer_type(self, env):
+    self.type = self.infer_compose(env, self.left, self.right)
+    return self.type
 
-def run(ast, args=['<progname>'], check_types=False):
-  ast = rewrite(ast, replace_nodes)
+  def eval(self, frame):
+    left = self.left.eval(frame)
+    right = self.right.eval(frame)
+    if is_function(left):
+      return self.compose(left, right)
+    return self.apply(right, self.left, left, frame)
+
+
+############
+# BUILTINS #
+############
+
+class Builtin(Value):
+  """ Function implemented in Python, value holds the implementation. """
+  name = None
+  names = None
+  arity = None
+
+  def __init__(self, name, names, function):
+    super().__init__(function)
+    self.name = name
+    self.names = names
+    self.arity = len(names)
+
+  def Call(self, frame):
+    # the implementation gets the caller's frame, names of
+    # the arguments should not be visible to functions it calls
+    return self.value(frame.parent, *[frame[name] for name in self.names])
+
+  def to_string(self, frame):
+    return "<builtin %s>" % self.name
+
+
+class builtin:
+  """ Decorator to register a builtin function f(frame, *args). """
+  def __init__(self, name, *args, scheme=None):
+    self.name = name
+    self.args = args
+    self.scheme = scheme
+
+  def __call__(self, f):
+    prelude[self.name] = Builtin(self.name, self.args, f)
+    if self.scheme:
+      builtins[self.name] = self.scheme
+    return f
+
+
+def forall(f):
+  """ Scheme of the type built by f from fresh type variables. """
+  tvars = [TVar(1) for _ in range(f.__code__.co_argcount)]
+  return Scheme(tvars, f(*tvars))
+
+
+@builtin('pmap', 'f', 'xs', scheme=forall(lambda a, b: TFunc([TFunc([a], b), TArray(a)], TArray(b))))
+def pmap(frame, f, xs):
+  """ Applies f to every element, in parallel if f is pure. """
+  import parallel  # concurrent.futures is slow to import
+  return parallel.pmap(f, list(elements(xs, frame)), frame)
+
+
+def elements(xs, frame):
+  """ Iterator over evaluated elements of an array or a sequence. """
+  if isinstance(xs, Seq):
+    return iter(xs)
+  if isinstance(xs, Array):
+    return (x.eval(frame) for x in xs)
+  raise Exception("%s is not an array or a sequence" % (xs,))
+
+
+def lazy_map(f, xs, frame):
+  frame.pin()  # f is called in it after the call that created the sequence returns
+  return Seq(lambda: (call_function(f, frame, [x]) for x in elements(xs, frame)))
+
+
+@builtin('map', 'f', 'xs', scheme=forall(lambda a, b: TFunc([TFunc([a], b), TArray(a)], TArray(b))))
+def map_(frame, f, xs):
+  return lazy_map(f, xs, frame)
+
+
+@builtin('filter', 'f', 'xs', scheme=forall(lambda a: TFunc([TFunc([a], TBool), TArray(a)], TArray(a))))
+def filter_(frame, f, xs):
+  frame.pin()
+  return Seq(lambda: (x for x in elements(xs, frame) if call_function(f, frame, [x])))
+
+
+@builtin('take', 'n', 'xs', scheme=forall(lambda a: TFunc([TInt, TArray(a)], TArray(a))))
+def take(frame, n, xs):
+  frame.pin()
+  return Seq(lambda: islice(elements(xs, frame), n.to_int()))
+
+
+@builtin('count', 'xs', scheme=forall(lambda a: TFunc([TArray(a)], TInt)))
+def count(frame, xs):
+  n = 0
+  for _ in elements(xs, frame):
+    n += 1
+  return Int(n)
+
+
+@builtin('lines', 's', scheme=TFunc([TStr], TArray(TStr)))
+def lines(frame, s):
+  """ Lines of a string, e.g., of shell command output. """
+  text = s.to_string(frame)
+  def generate():
+    start = 0
+    while start < len(text):
+      end = text.find("\n", start)
+      if end < 0:
+        end = len(text)
+      yield Str(text[start:end])
+      start = end + 1
+  return Seq(generate)
+
+
+def check(ast, checker=None):
+  """ Infers types of the program. Pass the same checker to
+      re-check only the definitions that changed.
+  """
+  if checker is None:
+    checker = Checker(builtins)
+  env = checker.check(ast)
+  main = checker.instantiate(env['main'])
+  ret = env.fresh()
+  env.unify(main, TFunc([TInt, TArray(TStr)], ret), "main")
+  assert resolve(ret) == TInt, \
+    "main() should return Int but got %s" % resolve(ret)
+  return env
+
+
+# nodes measured by the profiler and their measured methods
+profiled = OrderedDict([(Func, 'Call'), (Call, 'eval'), (Call0, 'eval'),
+                        (ShellCmd, 'eval'), (RegMatch, 'eval')])
+sampled = OrderedDict([(Func, 'Call'), (Func0, 'Call'), (ShellCmd, 'eval')])
+
+
+def translate(ast):
+  """ Substitutes parser nodes with the interpreter ones. """
+  with phase("replace_nodes") as p:
+    ast = rewrite(ast, replace_nodes)
+    p.count(nodes=lambda: size(ast))
+  return ast
+
+
+def run(ast, args=['<progname>'], check_types=False, memoize=True, profiler=None,
+        budget=None, sampler=None):
+  """ Runs main() of the program. With a budget (see limits.py) the run
+      raises limits.BudgetExceeded when it uses up a resource. A sampler
+      (see profiler.Sampler) samples call stacks while the program runs.
+  """
+  memo.enabled = memoize
+  if not isinstance(ast, Block):  # not translated yet
+    ast = translate(ast)
+  if profiler:
+    profiler.instrument(ast, profiled)
+  if sampler:
+    sampler.instrument(ast, sampled)
+    sampler.start()
   log.final_ast("the final AST is:\n", ast)
 
+  if budget:
+    budget.start()
+  limits.active = budget
+  try:
+    return execute(ast, args, check_types)
+  finally:
+    limits.active = None
+    if sampler:
+      sampler.stop()
+
+
+def execute(ast, args, check_types):
   frame = Frame()
-  ast.eval(frame)
+  frame.update(prelude)
+  with phase("toplevel") as p:
+    created = Frame.created
+    ast.eval(frame)
+    p.count(frames=lambda: Frame.created - created)
   log.topframe("the top frame is\n", frame)
 
   if 'main' not in frame:
     print("no main function defined, exiting")
     return 0
 
-  # type inference
+  # type inference, proven types specialize operations
   if check_types:
-    with frame as newframe:
-      newframe['argc'] = Int(len(args))
-      newframe['argv'] = Array(map(Str, args))
-      main = newframe['main']
-      main.infer_type(newframe)
-      assert main.type.ret == Int, \
-        "main() should return Int but got %s" % main.type.ret
+    with phase("check"):
+      check(ast)
+    with phase("specialize") as p:
+      p.count(nodes=specialize(ast))
 
 
-  with frame as newframe:
+  with phase("main") as p, frame as newframe:
+    created = Frame.created
     newframe['argc'] = Int(len(args))
     newframe['argv'] = Array(map(Str, args))
     r = newframe['main'].Call(newframe)
+    p.count(frames=lambda: Frame.created - created)
 
   if isinstance(r, Int):
     return r.to_int()
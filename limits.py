@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Execution budgets for untrusted scripts, see interpreter.run(budget=...)
+and dead.py --max-*. A budget limits the number of function calls,
+wall time, shell commands and memory growth (current RSS over the
+RSS at the start) of a run.
+
+The interpreter charges every call with active.call(): a counter
+and a comparison. Time and memory are checked every check_every
+calls, shell commands are given the remaining time as a timeout.
+Builtins iterating in Python (e.g., count over a huge range) are
+not interrupted before they return.
+"""
+
+from time import perf_counter
+import os
+
+active = None  # Budget of the running program, set by interpreter.run()
+
+
+class BudgetExceeded(Exception):
+  """ Raised when a program runs out of a resource. """
+  def __init__(self, resource, limit, usage):
+    self.resource = resource
+    self.limit = limit
+    self.usage = usage  # counters at the moment of raising, see Budget.usage()
+    super().__init__("%s budget exceeded (limit %s): %s" % (resource, limit,
+                     ", ".join("%s=%s" % kv for kv in usage.items())))
+
+
+class Budget:
+  check_every = 256  # calls between checks of time and memory
+
+  def __init__(self, calls=None, seconds=None, shells=None, memory=None):
+    self.max_calls = calls
+    self.max_seconds = seconds
+    self.max_shells = shells
+    self.max_memory = memory  # bytes of RSS growth since start()
+    self.start()
+
+  def start(self):
+    self.calls = 0
+    self.shells = 0
+    self.started = perf_counter()
+    self.rss = rss() if self.max_memory else 0
+    self.next_check = self.check_every
+    if self.max_calls is not None:
+      self.next_check = min(self.next_check, self.max_calls + 1)
+
+  def call(self):
+    self.calls += 1
+    if self.calls >= self.next_check:
+      self.check()
+
+  def check(self):
+    self.next_check = self.calls + self.check_every
+    if self.max_calls is not None:
+      if self.calls > self.max_calls:
+        self.exceeded('calls', self.max_calls)
+      self.next_check = min(self.next_check, self.max_calls + 1)
+    if self.max_seconds is not None and self.elapsed() > self.max_seconds:
+      self.exceeded('seconds', self.max_seconds)
+    if self.max_memory is not None and self.memory() > self.max_memory:
+      self.exceeded('memory', self.max_memory)
+
+  def shell(self):
+    """ Charges a shell command, returns its timeout in seconds or None. """
+    self.shells += 1
+    if self.max_shells is not None and self.shells > self.max_shells:
+      self.exceeded('shells', self.max_shells)
+    self.check()
+    if self.max_seconds is not None:
+      return self.max_seconds - self.elapsed()
+    return None
+
+  def elapsed(self):
+    return perf_counter() - self.started
+
+  def memory(self):
+    return max(0, rss() - self.rss) if self.max_memory else 0
+
+  def usage(self):
+    return {'calls': self.calls, 'shells': self.shells,
+            'seconds': round(self.elapsed(), 3), 'memory': self.memory()}
+
+  def exceeded(self, resource, limit):
+    raise BudgetExceeded(resource, limit, self.usage())
+
+  def __repr__(self):
+    return "Budget(calls=%s, seconds=%s, shells=%s, memory=%s)" % \
+      (self.max_calls, self.max_seconds, self.max_shells, self.max_memory)
+
+
+def rss():
+  """ Resident memory of the process in bytes. Where there is no
+      /proc (e.g., macOS) this is the peak, which never goes down:
+      a run in a long-lived process then shows growth only past
+      the peak of the earlier runs.
+  """
+  try:
+    with open('/proc/self/statm') as fd:
+      return int(fd.read().split()[1]) * PAGESIZE
+  except OSError:
+    import resource
+    import sys
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+PAGESIZE = os.sysconf('SC_PAGE_SIZE')
@@ -1,7 +1,5 @@
 #!/usr/bin/env python3
-from termcolor import colored
-from fnmatch import fnmatch
-from copy import copy
+import re
 import sys
 
 levels = ["debug", "info", "critical"]
@@ -16,43 +14,112 @@ styles = {
 
 
 class Filter:
+  """ Decides which log paths are printed. Rules are (pattern, mode)
+      pairs, the first matching pattern wins. Decisions are cached,
+      the cache is dropped when rules or default are assigned.
+  """
   def __init__(self, rules=[], default=True):
+    self.generation = 0
     self.rules = rules
     self.default = default
 
+  @property
+  def rules(self):
+    return self._rules
+
+  @rules.setter
+  def rules(self, rules):
+    from fnmatch import translate
+    self._rules = tuple(rules)
+    self._compiled = [(re.compile(translate(pattern)).match, mode)
+                      for pattern, mode in self._rules]
+    self.invalidate()
+
+  @property
+  def default(self):
+    return self._default
+
+  @default.setter
+  def default(self, default):
+    self._default = default
+    self.invalidate()
+
+  def invalidate(self):
+    self.cache = {}
+    self.generation += 1
+
   def test(self, path):
-    path = ".".join(path)
-    for pattern,mode in self.rules:
-      if fnmatch(path, pattern):
-        return mode
-    return self.default
+    if not isinstance(path, str):
+      path = ".".join(path)
+    try:
+      return self.cache[path]
+    except KeyError:
+      pass
+    for match, mode in self._compiled:
+      if match(path):
+        break
+    else:
+      mode = self.default
+    self.cache[path] = mode
+    return mode
 
 logfilter = Filter()
 
 
 class Log:
+  """
+  Hierarchical logger: log.a.b("msg") logs with path "prefix.a.b".
+  Children are created once and stored as attributes, so the path
+  is never mutated and loggers can be shared between threads.
+  Arguments are converted to strings only if the path is enabled.
+  """
   def __init__(self, prefix=[]):
     if isinstance(prefix, str):
         prefix = prefix.split('.')
-    self.prefix = prefix
-    self.path = copy(self.prefix)
+    self._prefix = list(prefix)
+    self._path = '.'.join(self._prefix)
+    self._generation = -1
+    self._enabled = False
 
   def __getattr__(self, name):
-    self.path.append(name)
-    return self
+    if name.startswith('__'):
+      raise AttributeError(name)
+    child = Log(self._prefix + [name])
+    self.__dict__[name] = child
+    return child
+
+  def __bool__(self):
+    """ Allows to skip expensive preparations: if log.x: log.x(...) """
+    if self._generation != logfilter.generation:
+      self._enabled = logfilter.test(self._path)
+      self._generation = logfilter.generation
+    return self._enabled
 
-  def __call__(self, *args, **kwargs):
-    self.log(*args, **kwargs)
+  def __call__(self, *msg):
+    if self._generation != logfilter.generation:
+      self._enabled = logfilter.test(self._path)
+      self._generation = logfilter.generation
+    if self._enabled:
+      self.log(*msg)
 
   def log(self, *msg):
-    if logfilter.test(self.path):
-      style = styles['debug']
-      msg = '.'.join(self.path)+': '+" ".join(str(m) for m in msg)
-      print(colored(msg, **style), file=sys.stderr)
-    self.path = copy(self.prefix)
+    """ Formats and prints the message. If the first argument
+        is a format string, the rest are its arguments.
+    """
+    if len(msg) > 1 and isinstance(msg[0], str) and '%' in msg[0]:
+      try:
+        msg = [msg[0] % msg[1:]]
+      except (TypeError, ValueError):  # not a format string, e.g., "100%" or "%z"
+        pass
+    from termcolor import colored  # only needed when something is logged
+    style = styles['debug']
+    msg = self._path+': '+" ".join(str(m) for m in msg)
+    print(colored(msg, **style), file=sys.stderr)
 
 
 if __name__ == '__main__':
   log = Log(["test"])
-  logfilter.set_verbosity("critical")
-  log.test1.test2.info("haba-haba")
+  logfilter.rules = [("test.test1.*", True)]
+  logfilter.default = False
+  log.test1.test2.info("haba-haba %s", 42)
+  log.test2("not shown")
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+""" Bounded memo tables for pure deadscript functions. """
+
+from collections import OrderedDict
+import sys
+
+enabled = True       # global opt-out, see dead.py --no-memo
+maxsize = 1024       # max entries per function
+maxmem  = 1 << 20    # max approximate bytes per function
+tables  = []         # all tables ever created, used by report()
+
+MISS = object()
+
+
+def approx_size(obj):
+  """ Rough size of a memo key or value in bytes. """
+  if isinstance(obj, type):
+    return 0  # classes are shared by all keys
+  size = sys.getsizeof(obj)
+  if isinstance(obj, tuple):
+    size += sum(approx_size(x) for x in obj)
+  elif getattr(obj, 'parts', None) is not None:
+    size += obj.length  # a rope, reading value would join it
+  elif hasattr(obj, 'value'):
+    size += sys.getsizeof(obj.value)
+  return size
+
+
+class Memo:
+  """ LRU table with a cap on the number of entries and memory. """
+  def __init__(self, name, maxsize=maxsize, maxmem=maxmem):
+    self.name = name
+    self.maxsize = maxsize
+    self.maxmem = maxmem
+    self.cache = OrderedDict()
+    self.mem = 0
+    self.hits = 0
+    self.misses = 0
+    tables.append(self)
+
+  def get(self, key):
+    value = self.cache.get(key, MISS)
+    if value is MISS:
+      self.misses += 1
+      return MISS
+    self.cache.move_to_end(key)
+    self.hits += 1
+    return value[0]
+
+  def put(self, key, value):
+    size = approx_size(key) + approx_size(value)
+    if size > self.maxmem:
+      return
+    self.cache[key] = value, size
+    self.mem += size
+    while len(self.cache) > self.maxsize or self.mem > self.maxmem:
+      _, (_, size) = self.cache.popitem(last=False)
+      self.mem -= size
+
+  def __len__(self):
+    return len(self.cache)
+
+  def __repr__(self):
+    cls = self.__class__.__name__
+    return "%s(%s, hits=%s, misses=%s, size=%s)" % \
+      (cls, self.name, self.hits, self.misses, len(self))
+
+
+def report(file=sys.stderr):
+  """ Print hits and misses of every memo table. """
+  print("%-20s %10s %10s %8s %10s" % ("function", "hits", "misses", "entries", "bytes"), file=file)
+  for t in sorted(tables, key=lambda t: t.hits+t.misses, reverse=True):
+    print("%-20s %10s %10s %8s %10s" % (t.name, t.hits, t.misses, len(t), t.mem), file=file)
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Parallel map for the pmap builtin. Elements are split into chunks
+that run on a pool of forked processes. A task carries the function
+and the values of the outer names it refers to (scoping is dynamic,
+so they are looked up in the frame of the pmap call). Small inputs,
+impure functions and calls from a worker run serially.
+"""
+
+from interpreter import Func, Array, Seq, call_function, is_pure, generic_type
+from frame import Frame
+from log import Log
+import pickle
+import os
+log = Log("parallel")
+
+min_items = 32          # smaller inputs are mapped serially
+chunks_per_worker = 4   # more chunks balance uneven elements
+workers = None          # number of processes, all CPUs by default
+in_worker = False
+executor = None
+
+
+def pool():
+  global executor
+  if executor is None:
+    from concurrent.futures import ProcessPoolExecutor
+    import multiprocessing
+    executor = ProcessPoolExecutor(workers or os.cpu_count(), initializer=init_worker,
+                                   mp_context=multiprocessing.get_context('fork'))
+  return executor
+
+
+def init_worker():
+  global in_worker
+  in_worker = True
+
+
+def captured(func, frame):
+  """ Values of the outer names used by the function and by
+      the functions it refers to by name.
+  """
+  env = {}
+  stack = [func]
+  seen = set()
+  while stack:
+    f = stack.pop()
+    if id(f) in seen:
+      continue
+    seen.add(id(f))
+    for name in f.free:
+      if name not in env:
+        value = frame[name]
+        if isinstance(value, Func):
+          stack.append(value)
+        else:
+          value = force(value, frame)
+        env[name] = value
+  return env
+
+
+def force(value, frame):
+  """ Evaluates array elements and sequences into arrays, so the
+      result does not refer to names of the frame it was computed
+      in and can be pickled.
+  """
+  if type(value) is Array:
+    return Array([force(x.eval(frame), frame) for x in value])
+  if isinstance(value, Seq):
+    return Array([force(x, frame) for x in value])
+  return value
+
+
+def apply(func, items, frame):
+  return [force(call_function(func, frame, [x]), frame) for x in items]
+
+
+def run_chunk(func, env, items):
+  """ Runs in a worker. """
+  frame = Frame()
+  frame.update(env)
+  return apply(func, items, frame)
+
+
+def parallel(func, items, frame):
+  """ True if the map is worth shipping to the pool. """
+  if in_worker or len(items) < min_items:
+    return False
+  if generic_type(func) is not Func:
+    return False
+  return is_pure(func, frame, set())
+
+
+def pmap(func, items, frame):
+  if not parallel(func, items, frame):
+    log.pmap("serial map of", len(items), "items")
+    return Array(apply(func, items, frame))
+  env = captured(func, frame)
+  nchunks = (workers or os.cpu_count()) * chunks_per_worker
+  size = max(1, -(-len(items) // nchunks))
+  log.pmap("parallel map of %s items in chunks of %s", len(items), size)
+  futures = [pool().submit(run_chunk, func, env, items[i:i+size])
+             for i in range(0, len(items), size)]
+  result = []
+  try:
+    for future in futures:
+      result += future.result()
+  except (pickle.PicklingError, AttributeError, TypeError) as err:
+    # a value that cannot be sent to a worker, errors of
+    # the function itself are raised again by the serial map
+    log.pmap("falling back to a serial map:", err)
+    for future in futures:
+      future.cancel()
+    return Array(apply(func, items, frame))
+  return Array(result)
@@ -1,4 +1,5 @@
 #!/usr/bin/env python3
+from functools import cached_property
 import re
 
 
@@ -23,10 +24,14 @@ class Grammar:
 class RE(Grammar):
   def __init__(self, pattern, token=str, passval=True):
     self.pattern_orig = pattern
-    self.pattern = re.compile("\s*(%s)" % pattern)
     self.token   = token
     self.passval = passval
 
+  @cached_property
+  def pattern(self):
+    """ Compiled on first use, so unused grammars cost nothing at import. """
+    return re.compile("\s*(%s)" % self.pattern_orig)
+
   def parse(self, text, pos=0):
     m = self.pattern.match(text[pos:])
     if not m:
@@ -48,6 +53,30 @@ class SYMBOL(RE):
     super().__init__(re.escape(symbol), *args, passval=False, **kwargs)
 
 
+class SYMBOLS(RE):
+  """ Any of the symbols, a faster equivalent of OR(SYMBOL(s1, t1), ...).
+      Longer symbols are tried first because the first match wins.
+  """
+  def __init__(self, table):
+    self.symbols = sorted(table, key=len, reverse=True)
+    self.tokens = [table[s] for s in self.symbols]
+    super().__init__("|".join(re.escape(s) for s in self.symbols))
+
+  @cached_property
+  def pattern(self):
+    # every alternative has its own \s* to backtrack exactly like OR does
+    return re.compile("|".join("\s*(%s)" % re.escape(s) for s in self.symbols))
+
+  def parse(self, text, pos=0):
+    m = self.pattern.match(text[pos:])
+    if not m:
+      raise NoMatch("syntax error", text, pos)
+    return self.tokens[m.lastindex-1](), pos+m.end()
+
+  def __repr__(self):
+    return "%s(%s)" % (self.__class__.__name__, self.symbols)
+
+
 ########################
 # HIGHER-ORDER PARSERS #
 ########################
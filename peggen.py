@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Parser generator for peg.py grammars. Instead of walking the
+grammar objects at parse time, it emits a Python module with a
+function per composite rule: alternatives are tried with plain
+ifs, no NoMatch is raised inside, and runs of regex alternatives
+(RE, SYMBOL, SYMBOLS and ORs of them) are merged into a single
+precompiled regex dispatched by the number of the matched group.
+
+  ./peggen.py tokenizer:PROGRAM -o tokenizer_peg.py
+
+The module has parse(text, pos=0) with the same results as
+GRAMMAR.parse() and GRAMMAR, repr() of the grammar it was built
+from, to detect stale modules. load() builds the parser in memory.
+"""
+
+from peg import RE, SYMBOLS, OR, SOMEOF, MAYBE, ALL, NoMatch
+import builtins
+import re
+
+HEADER = '''\
+# Generated by peggen.py from %(source)s, do not edit.
+# Regenerate with: ./peggen.py %(source)s -o %(output)s
+from peg import NoMatch
+import re
+'''
+
+
+def mergeable(g):
+  """ True if g can be a part of a merged alternation. """
+  if isinstance(g, OR):
+    return all(mergeable(t) for t in g.things)
+  if not isinstance(g, RE):
+    return False
+  # group numbers and anchors would change their meaning
+  return not re.search(r"\\[1-9]|\(\?P[<=]|\(\?<|(?<![\[\\])\^|\(\?[aiLmsux]", g.pattern_orig)
+
+
+def alternatives(g):
+  """ Flattens ORs of regexes into [(pattern, token, value group or None)],
+      value group is relative to the start of the alternative.
+  """
+  if isinstance(g, OR):
+    return [a for t in g.things for a in alternatives(t)]
+  if isinstance(g, SYMBOLS):
+    return [(r"\s*" + re.escape(s), t, None) for s, t in zip(g.symbols, g.tokens)]
+  groups = re.compile(g.pattern_orig).groups
+  return [(r"\s*(%s)" % g.pattern_orig, g.token, 1 + groups if g.passval else None)]
+
+
+class Generator:
+  def __init__(self):
+    self.defs = []     # module-level definitions
+    self.funcs = []    # generated functions
+    self.names = {}    # id(grammar) -> function name
+    self.imports = {}  # token -> expression
+    self.keep = []     # grammars referenced by names, so their ids stay unique
+    self.regexes = {}  # ids of merged alternatives -> (regex, table)
+
+  def token(self, tok):
+    """ Expression that refers to tok in the generated module. """
+    if tok in self.imports:
+      return self.imports[tok]
+    if getattr(builtins, tok.__name__, None) is tok:
+      expr = tok.__name__
+    elif hasattr(tok, 'sym'):  # pratt symbol, classes are created on the fly
+      from pratt import symap
+      assert symap.get(tok.sym) is tok, "unknown symbol %r" % tok
+      if "from pratt import symap" not in self.defs:
+        self.defs.append("from pratt import symap")
+      expr = "symap[%r]" % tok.sym
+    else:
+      module = __import__(tok.__module__, fromlist=[tok.__qualname__])
+      assert getattr(module, tok.__qualname__, None) is tok, \
+        "token %r cannot be imported" % tok
+      expr = "_t%d" % len(self.imports)
+      self.defs.append("from %s import %s as %s" % (tok.__module__, tok.__qualname__, expr))
+    self.imports[tok] = expr
+    return expr
+
+  def regex(self, things):
+    """ Defines a merged regex of the alternatives, returns its name
+        and the dispatch table name: group number -> (token, value group).
+    """
+    key = tuple(id(t) for t in things)
+    if key in self.regexes:
+      return self.regexes[key]
+    n = len(self.regexes)
+    parts, table, group = [], {}, 1
+    for pattern, tok, value in (a for t in things for a in alternatives(t)):
+      parts.append("(%s)" % pattern)
+      table[group] = (self.token(tok), None if value is None else group + value)
+      group += 1 + re.compile(pattern).groups
+    self.defs.append("_re%d = re.compile(%r).match" % (n, "|".join(parts)))
+    self.defs.append("_tab%d = {%s}" % (n, ", ".join("%d: (%s, %s)" % (k, t, v) for k, (t, v) in table.items())))
+    self.keep += things
+    self.regexes[key] = "_re%d" % n, "_tab%d" % n
+    return self.regexes[key]
+
+  def runs(self, things):
+    """ Splits alternatives into merged regexes and other rules. """
+    result, run = [], []
+    for t in things:
+      if mergeable(t):
+        run.append(t)
+        continue
+      if run:
+        result.append(('re', self.regex(run)))
+        run = []
+      result.append(('rule', self.rule(t)))
+    if run:
+      result.append(('re', self.regex(run)))
+    return result
+
+  def try_all(self, things, indent, on_match):
+    """ Code trying alternatives at pos, on_match(value) is the code
+        for a success. It has to leave the function or the loop unless
+        there is one alternative, execution falls through if nothing
+        matches.
+    """
+    code = []
+    for kind, what in self.runs(things):
+      if kind == 're':
+        match, table = what
+        code += ["m = %s(text, pos)" % match,
+                 "if m:",
+                 "  tok, g = %s[m.lastindex]" % table,
+                 "  pos = m.end()"]
+        code += ["  " + l for l in on_match("tok(m.group(g)) if g else tok()")]
+      else:
+        code += ["r = %s(text, pos)" % what,
+                 "if r is not None:",
+                 "  pos = r[1]"]
+        code += ["  " + l for l in on_match("r[0]")]
+    return [" "*indent + l for l in code]
+
+  def rule(self, g):
+    """ Generates the function for g and returns its name. """
+    if id(g) in self.names:
+      return self.names[id(g)]
+    name = "_p%d" % len(self.names)
+    self.names[id(g)] = name
+    self.keep.append(g)
+    body = []
+    if isinstance(g, RE) and not mergeable(g):
+      # matched on a slice like RE.parse() does, for anchors and lookbehinds
+      n = name[2:]
+      value = "%s(m.group(%d))" % (self.token(g.token), g.pattern.groups) if g.passval \
+              else "%s()" % self.token(g.token)
+      self.defs.append("_slice%s = re.compile(%r).match" % (n, g.pattern.pattern))
+      body += ["  m = _slice%s(text[pos:])" % n,
+               "  if m:",
+               "    return %s, pos + m.end()" % value,
+               "  return None"]
+    elif isinstance(g, (RE, OR)):
+      body += self.try_all([g] if isinstance(g, RE) else g.things, 2,
+                           lambda v: ["return %s, pos" % v])
+      body += ["  return None"]
+    elif isinstance(g, SOMEOF):
+      body += ["  result = []",
+               "  while True:"]
+      body += self.try_all(g.things, 4, lambda v: ["result.append(%s)" % v, "continue"])
+      body += ["    break",
+               "  if not result:",
+               "    return None",
+               "  return result, pos"]
+    elif isinstance(g, (ALL, MAYBE)):
+      fail = "return None, start" if isinstance(g, MAYBE) else "return None"
+      body += ["  start = pos",
+               "  result = []"]
+      for i, t in enumerate(g.things, 1):
+        body += self.try_all([t], 2, lambda v: ["result.append(%s)" % v])
+        body += ["  if len(result) < %d:" % i,
+                 "    " + fail]
+      body += ["  return result, pos"]
+    else:
+      raise TypeError("cannot generate code for %r" % g)
+    self.funcs.append("\n".join(["def %s(text, pos):" % name] + body))
+    return name
+
+  def module(self, grammar, source="<grammar>", output="<output>"):
+    top = self.rule(grammar)
+    return "\n".join([HEADER % {'source': source, 'output': output}]
+                     + self.defs + [""]
+                     + ["GRAMMAR = %r" % repr(grammar), ""]
+                     + [f + "\n" for f in self.funcs]
+                     + ["def parse(text, pos=0):",
+                        "  r = %s(text, pos)" % top,
+                        "  if r is None:",
+                        "    raise NoMatch(\"syntax error\", text, pos)",
+                        "  return r", ""])
+
+
+def generate(grammar, source="<grammar>", output="<output>"):
+  """ Source code of the parser module for the grammar. """
+  return Generator().module(grammar, source, output)
+
+
+def load(grammar):
+  """ The generated parse() without writing the module to a file. """
+  ns = {}
+  exec(compile(generate(grammar), "<peggen>", "exec"), ns)
+  return ns['parse']
+
+
+def differential(grammar, parse, texts):
+  """ Runs both parsers on the texts, returns [(text, expected, got)]
+      for the texts where they disagree.
+  """
+  diffs = []
+  for text in texts:
+    expected, got = outcome(grammar.parse, text), outcome(parse, text)
+    if not same(expected, got):
+      diffs.append((text, expected, got))
+  return diffs
+
+
+def outcome(parse, text):
+  try:
+    return parse(text)
+  except NoMatch:
+    return NoMatch
+
+
+def same(a, b):
+  """ Structural equality of parse results, tokens are compared by type and value. """
+  if type(a) is not type(b):
+    return False
+  if isinstance(a, (list, tuple)):
+    return len(a) == len(b) and all(same(x, y) for x, y in zip(a, b))
+  if isinstance(a, (str, int, type(None), type)):
+    return a == b
+  return getattr(a, 'value', None) == getattr(b, 'value', None)
+
+
+if __name__ == '__main__':
+  import argparse
+  import importlib
+  import sys
+  parser = argparse.ArgumentParser()
+  parser.add_argument('grammar', help="module:NAME of the grammar, e.g. tokenizer:PROGRAM")
+  parser.add_argument('-o', '--output', help="path of the module, stdout if omitted")
+  args = parser.parse_args()
+  module, _, name = args.grammar.partition(':')
+  grammar = getattr(importlib.import_module(module), name)
+  code = generate(grammar, args.grammar, args.output or "<output>")
+  if args.output:
+    with open(args.output, 'w') as fd:
+      fd.write(code)
+  else:
+    sys.stdout.write(code)
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Per-node execution profiler, see dead.py --profile, and sampling
+profiler of deadscript call stacks, see dead.py --sample.
+Nodes are instrumented by switching their class to a subclass
+with a measuring wrapper, so a program that is not profiled
+runs exactly the same code as before.
+"""
+
+from collections import Counter
+from time import perf_counter
+from ast import walk
+import threading
+import json
+import sys
+
+
+class Instrumenter:
+  """ Base of the profilers. A node is instrumented by switching its
+      class to a subclass that wraps one method. Subclasses define
+      wrap(cls, orig), which returns the replacement of the method,
+      and label_attr. The generated subclass keeps the original
+      class in .generic for the checks that look at exact node
+      classes (see interpreter.generic_type) and is pickled as it.
+  """
+  label_attr = None  # instance attribute the wrapper caches its label in
+
+  def __init__(self):
+    self.wrappers = {}
+
+  def instrument(self, tree, targets):
+    """ Instruments nodes of the tree. Targets map node
+        classes to the name of the method to wrap.
+    """
+    for node in walk(tree):
+      cls = type(node)
+      for target, method in targets.items():
+        if isinstance(node, target):
+          node.__class__ = self.wrapper(cls, method)
+          break
+    return tree
+
+  def wrapper(self, cls, method):
+    try:
+      return self.wrappers[cls]
+    except KeyError:
+      pass
+    Wrapper = type(cls.__name__, (cls,), {
+      method: self.wrap(cls, getattr(cls, method)),
+      self.label_attr: None,
+      'generic': getattr(cls, 'generic', None) or cls,
+      '__reduce_ex__': reduce_generic,
+    })
+    Wrapper.__qualname__ = cls.__qualname__
+    self.wrappers[cls] = Wrapper
+    return Wrapper
+
+
+def reduce_generic(node, protocol):
+  """ Pickles an instrumented node as the original class, the
+      generated subclasses exist only in this process (e.g., a
+      function sent to the workers of pmap).
+  """
+  _, _, *rest = object.__reduce_ex__(node, protocol)
+  return (new_node, (node.generic,), *rest)
+
+
+def new_node(cls):
+  return cls.__new__(cls)
+
+
+class Profiler(Instrumenter):
+  label_attr = 'profile_key'
+
+  def __init__(self):
+    super().__init__()
+    self.stats = {}      # key -> [count, inclusive, exclusive]
+    self.children = [0.0]  # time spent in nested measured nodes
+    self.active = {}     # key -> recursion depth, to not count inclusive time twice
+
+  def wrap(self, cls, orig):
+    measure = self.measure
+    def wrapped(self, *args):
+      key = self.profile_key
+      if key is None:  # functions get their names only when assigned
+        key = self.profile_key = "%s:%s %s" % (self.lineno or '?', cls.__name__, label(self))
+      return measure(key, orig, self, *args)
+    return wrapped
+
+  def measure(self, key, f, *args):
+    active = self.active
+    depth = active.get(key, 0)
+    active[key] = depth + 1
+    self.children.append(0.0)
+    t = perf_counter()
+    try:
+      return f(*args)
+    finally:
+      elapsed = perf_counter() - t
+      nested = self.children.pop()
+      self.children[-1] += elapsed
+      active[key] = depth
+      s = self.stats.get(key)
+      if s is None:
+        s = self.stats[key] = [0, 0.0, 0.0]
+      s[0] += 1
+      if not depth:  # recursive calls are already inside the outermost one
+        s[1] += elapsed
+      s[2] += elapsed - nested
+
+  def report(self, file=sys.stderr, limit=30):
+    rows = sorted(self.stats.items(), key=lambda kv: kv[1][1], reverse=True)
+    print("%10s %12s %12s  %s" % ("count", "incl, ms", "excl, ms", "node"), file=file)
+    for key, (count, incl, excl) in rows[:limit]:
+      print("%10s %12.3f %12.3f  %s" % (count, incl*1000, excl*1000, key), file=file)
+
+  def dump(self, path):
+    rows = [{'node': key, 'count': count, 'inclusive': incl, 'exclusive': excl}
+            for key, (count, incl, excl) in self.stats.items()]
+    with open(path, 'w') as fd:
+      json.dump(rows, fd, indent=1)
+
+
+class Sampler(Instrumenter):
+  """ Keeps the stack of running functions and samples it from a
+      background thread every interval seconds. Samples are written
+      in the folded format of flamegraph.pl: "main;f;g 12".
+  """
+  label_attr = 'sample_key'
+
+  def __init__(self, interval=0.001):
+    super().__init__()
+    self.interval = interval
+    self.stack = []          # labels of running functions, innermost last
+    self.samples = Counter()  # stack tuple -> number of samples
+    self.thread = None
+    self.stopped = threading.Event()
+
+  def wrap(self, cls, orig):
+    stack = self.stack
+    def wrapped(self, *args):
+      key = self.sample_key
+      if key is None:  # functions get their names only when assigned
+        key = self.sample_key = "%s:%s" % (label(self) or "<lambda>", self.lineno or '?')
+      stack.append(key)
+      try:
+        return orig(self, *args)
+      finally:
+        stack.pop()
+    return wrapped
+
+  def start(self):
+    self.stopped.clear()
+    self.thread = threading.Thread(target=self.sample, name="sampler", daemon=True)
+    self.thread.start()
+
+  def stop(self):
+    self.stopped.set()
+    if self.thread:
+      self.thread.join()
+      self.thread = None
+
+  def sample(self):
+    stack, samples = self.stack, self.samples
+    while not self.stopped.wait(self.interval):
+      if stack:
+        samples[tuple(stack)] += 1
+
+  def folded(self, file=sys.stdout):
+    for stack, count in sorted(self.samples.items()):
+      print(";".join(f.replace(';', ',') for f in stack), count, file=file)
+
+  def dump(self, path):
+    with open(path, 'w') as fd:
+      self.folded(fd)
+
+  def report(self, file=sys.stderr, limit=20):
+    """ Functions by samples on top of the stack (self) and anywhere in it (total). """
+    own, total = Counter(), Counter()
+    for stack, count in self.samples.items():
+      own[stack[-1]] += count
+      for f in set(stack):
+        total[f] += count
+    n = sum(self.samples.values()) or 1
+    print("%10s %8s %8s  %s" % ("samples", "self, %", "total, %", "function"), file=file)
+    for f, count in total.most_common(limit):
+      print("%10s %8.1f %8.1f  %s" % (count, own[f]*100/n, count*100/n, f), file=file)
+
+
+def label(node):
+  """ Human-readable name of the profiled node. """
+  name = getattr(node, 'name', None)
+  if name:
+    return name
+  for field in ('func', 'arg', 'left'):
+    try:
+      sub = getattr(node, field)
+    except AttributeError:
+      continue
+    if hasattr(sub, 'value'):
+      return str(sub.value)
+  return str(getattr(node, 'value', ''))
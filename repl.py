@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Interactive interpreter. The top-level frame lives between inputs,
+every input is parsed and translated on its own and the result is
+cached, so entering the same definition again costs only its eval.
+"""
+
+from tokenizer import tokenize
+from indent import parse as indent_parse
+from ast import parse
+from interpreter import translate, prelude, Int, Str, Array, Func, Func0
+from frame import Frame
+from log import Log
+import sys
+log = Log("repl")
+
+PS1 = ">>> "
+PS2 = "... "
+BLOCK_OPENERS = ("->", "=>", "match")
+
+
+class Repl:
+  def __init__(self, args=['<repl>']):
+    self.frame = Frame()
+    self.frame.update(prelude)
+    self.frame['argc'] = Int(len(args))
+    self.frame['argv'] = Array(map(Str, args))
+    self.cache = {}  # source -> translated tree
+
+  def compile(self, src):
+    try:
+      return self.cache[src]
+    except KeyError:
+      pass
+    tree = translate(parse(indent_parse(tokenize(src))))
+    self.cache[src] = tree
+    log.compile("compiled", tree)
+    return tree
+
+  def eval(self, src):
+    """ Evaluates a chunk of code in the top frame. """
+    return self.compile(src).eval(self.frame)
+
+  def show(self, value):
+    if value is None:
+      return None
+    if isinstance(value, (Func, Func0)):
+      return "<function %s>" % (value.name or "<lambda>")
+    if hasattr(value, 'to_string'):
+      return value.to_string(self.frame)
+    return repr(value)
+
+  def read(self, input=input):
+    """ Reads one chunk: a line or an indented block that
+        ends with an empty line.
+    """
+    line = input(PS1)
+    lines = [line]
+    if line.rstrip().endswith(BLOCK_OPENERS):
+      while True:
+        line = input(PS2)
+        if not line.strip():
+          break
+        lines.append(line)
+    return "\n".join(lines)
+
+  def loop(self, input=input):
+    while True:
+      try:
+        src = self.read(input)
+      except EOFError:
+        print()
+        return
+      except KeyboardInterrupt:
+        print()
+        continue
+      if not src.strip():
+        continue
+      try:
+        result = self.show(self.eval(src))
+      except KeyboardInterrupt:
+        print("interrupted")
+        continue
+      except Exception as err:
+        print("%s: %s" % (type(err).__name__, err), file=sys.stderr)
+        continue
+      if result is not None:
+        print(result)
+
+
+def main(args=['<repl>']):
+  try:
+    import readline  # line editing and history, optional
+  except ImportError:
+    pass
+  Repl(args).loop()
+
+
+if __name__ == '__main__':
+  from log import logfilter
+  logfilter.default = False
+  main(sys.argv)
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Golden-output test runner. Every tests/*.ls is run as
+
+  dead.py tests/name.ls
+
+every tests/parser/*.ls as
+
+  dead.py -n -a tests/parser/name.ls
+
+and every tests/checked/*.ls as
+
+  dead.py -c --no-memo --stats tests/checked/name.ls
+
+and every tests/budget/*.ls, scripts that run out of a budget, as
+
+  dead.py --max-calls 10000 --max-memory 64 tests/budget/name.ls
+
+on a pool of workers. Stdout and exit code are compared against
+name.out and name.exit next to the script, checked tests have
+stderr (the cache counters) in name.out too. Wall time and peak RSS
+of every run are compared against tests/baseline.json, tests that
+got slower (or bigger) by more than the threshold are flagged.
+
+  runtests.py                 # run everything
+  runtests.py match parser/   # run tests whose path contains a pattern
+  runtests.py --update        # rewrite goldens and the baseline
+
+Exit code is 1 if an output differs (or, with --strict, if a test
+regressed).
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+from glob import glob
+import subprocess
+import tempfile
+import argparse
+import difflib
+import json
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+DEAD = os.path.join(ROOT, 'dead.py')
+BASELINE = os.path.join('tests', 'baseline.json')
+
+
+class Test:
+  def __init__(self, path, flags=(), stderr=False):
+    self.path = path  # relative to ROOT, it is argv[0] of the program
+    self.cmd = [sys.executable, DEAD] + list(flags) + [path]
+    self.stderr = stderr  # keep stderr in the output
+    self.stdout = b""
+    self.exit = None
+    self.time = 0.0
+    self.maxrss = 0  # KiB
+
+  @property
+  def name(self):
+    return os.path.relpath(self.path, 'tests')
+
+  @property
+  def golden(self):
+    return os.path.join(ROOT, os.path.splitext(self.path)[0])
+
+  def run(self, repeat=1):
+    """ Runs the script repeat times, keeps the best time. """
+    best = None
+    for _ in range(repeat):
+      with tempfile.TemporaryFile() as out:
+        t = perf_counter()
+        proc = subprocess.Popen(self.cmd, cwd=ROOT, stdout=out,
+                                stdin=subprocess.DEVNULL,
+                                stderr=subprocess.STDOUT if self.stderr else subprocess.DEVNULL)
+        _, status, usage = os.wait4(proc.pid, 0)  # Popen.wait() would lose the rusage
+        elapsed = perf_counter() - t
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        out.seek(0)
+        self.stdout = out.read()
+      self.exit = proc.returncode
+      self.maxrss = max(self.maxrss, usage.ru_maxrss)
+      if best is None or elapsed < best:
+        best = elapsed
+    self.time = best
+    return self
+
+  def expected(self):
+    """ Returns (stdout, exit code) from the golden files or None. """
+    try:
+      with open(self.golden + '.out', 'rb') as fd:
+        out = fd.read()
+      with open(self.golden + '.exit') as fd:
+        code = int(fd.read())
+    except FileNotFoundError:
+      return None
+    return out, code
+
+  def update(self):
+    with open(self.golden + '.out', 'wb') as fd:
+      fd.write(self.stdout)
+    with open(self.golden + '.exit', 'w') as fd:
+      print(self.exit, file=fd)
+
+  def diff(self):
+    """ Returns a list of lines describing the mismatch, empty if none. """
+    expected = self.expected()
+    if expected is None:
+      return ["no golden files, run with --update"]
+    out, code = expected
+    result = []
+    if code != self.exit:
+      result.append("exit code %s, expected %s" % (self.exit, code))
+    if out != self.stdout:
+      result += difflib.unified_diff(
+        out.decode(errors='replace').splitlines(),
+        self.stdout.decode(errors='replace').splitlines(),
+        'expected', 'got', lineterm='')
+    return result
+
+
+def collect(patterns=()):
+  tests = [Test(p) for p in sorted(glob(os.path.join('tests', '*.ls'), root_dir=ROOT))]
+  tests += [Test(p, ['-n', '-a'])
+            for p in sorted(glob(os.path.join('tests', 'parser', '*.ls'), root_dir=ROOT))]
+  tests += [Test(p, ['-c', '--no-memo', '--stats'], stderr=True)
+            for p in sorted(glob(os.path.join('tests', 'checked', '*.ls'), root_dir=ROOT))]
+  tests += [Test(p, ['--max-calls', '10000', '--max-memory', '64'])
+            for p in sorted(glob(os.path.join('tests', 'budget', '*.ls'), root_dir=ROOT))]
+  if patterns:
+    tests = [t for t in tests if any(p in t.name for p in patterns)]
+  return tests
+
+
+def load_baseline():
+  try:
+    with open(os.path.join(ROOT, BASELINE)) as fd:
+      return json.load(fd)
+  except FileNotFoundError:
+    return {}
+
+
+def save_baseline(baseline):
+  with open(os.path.join(ROOT, BASELINE), 'w') as fd:
+    json.dump(baseline, fd, indent=2, sort_keys=True)
+    print(file=fd)
+
+
+def regressions(test, base, threshold, slack):
+  """ Returns what got worse compared to the baseline entry. """
+  result = []
+  if not base:
+    return result
+  if test.time > base['time'] * (1 + threshold) and test.time - base['time'] > slack:
+    result.append("time %.0f ms, baseline %.0f ms" % (test.time*1000, base['time']*1000))
+  if test.maxrss > base['maxrss'] * (1 + threshold):
+    result.append("peak %d KiB, baseline %d KiB" % (test.maxrss, base['maxrss']))
+  return result
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser()
+  parser.add_argument('patterns', nargs='*', help="run only tests whose path contains one of these")
+  parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                      help="number of tests run at once (default: %(default)s)")
+  parser.add_argument('-r', '--repeat', type=int, default=3,
+                      help="run every test N times, take the best time (default: %(default)s)")
+  parser.add_argument('-t', '--threshold', type=float, default=0.25,
+                      help="flag tests slower or bigger than the baseline by this fraction (default: %(default)s)")
+  parser.add_argument('--slack', type=float, default=0.05,
+                      help="ignore slowdowns below this many seconds (default: %(default)s)")
+  parser.add_argument('--strict', action='store_true', help="fail on performance regressions")
+  parser.add_argument('-u', '--update', action='store_true', help="rewrite goldens and the baseline")
+  parser.add_argument('-v', '--verbose', action='store_true', help="print time and memory of every test")
+  args = parser.parse_args(argv)
+
+  tests = collect(args.patterns)
+  baseline = load_baseline()
+  t = perf_counter()
+  with ThreadPoolExecutor(args.jobs) as pool:
+    tests = list(pool.map(lambda test: test.run(args.repeat), tests))
+  elapsed = perf_counter() - t
+
+  failed = regressed = 0
+  for test in tests:
+    if args.update:
+      test.update()
+      baseline[test.name] = {'time': round(test.time, 4), 'maxrss': test.maxrss}
+      status, notes = "UPDATED", []
+    else:
+      notes = test.diff()
+      slower = regressions(test, baseline.get(test.name), args.threshold, args.slack)
+      failed += bool(notes)
+      regressed += bool(slower)
+      status = "FAIL" if notes else "SLOW" if slower else "ok"
+      notes += slower
+    if args.verbose or notes or args.update:
+      print("%-8s %-24s %8.0f ms %8d KiB" % (status, test.name, test.time*1000, test.maxrss))
+    for line in notes:
+      print("  " + line)
+  if args.update:
+    save_baseline(baseline)
+
+  print("%d tests in %.2f s, %d failed, %d regressed" % (len(tests), elapsed, failed, regressed))
+  return 1 if failed or (args.strict and regressed) else 0
+
+
+if __name__ == '__main__':
+  sys.exit(main())
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Phase timing and memory instrumentation.
+Code marks its phases with
+
+  with phase("tokenize") as p:
+    tokens = tokenize(src)
+    p.count(tokens=len(tokens))
+
+Every finished phase is passed to registered hooks as a Record.
+Without hooks phase() measures nothing.
+"""
+
+from time import perf_counter, process_time
+from itertools import count
+import sys
+
+tracemalloc = None  # imported by add_hook(), nothing is traced without hooks
+
+hooks = []
+stack = []  # active phases
+started = count()
+
+
+def add_hook(hook):
+  """ Registers hook(record), starts tracing memory allocations. """
+  global tracemalloc
+  import tracemalloc
+  if not tracemalloc.is_tracing():
+    tracemalloc.start()
+  hooks.append(hook)
+
+
+def remove_hook(hook):
+  hooks.remove(hook)
+  if not hooks and tracemalloc.is_tracing():
+    tracemalloc.stop()
+
+
+class Record:
+  def __init__(self, name, depth):
+    self.name = name
+    self.depth = depth
+    self.seq = next(started)
+    self.wall = self.cpu = 0.0
+    self.blocks = 0  # allocated blocks after minus before
+    self.alloc = 0   # traced bytes after minus before
+    self.peak = 0    # max traced bytes during the phase
+    self.counts = {}
+
+  def as_dict(self):
+    d = {'phase': self.name, 'depth': self.depth, 'wall': self.wall,
+         'cpu': self.cpu, 'blocks': self.blocks, 'alloc': self.alloc,
+         'peak': self.peak}
+    d.update(self.counts)
+    return d
+
+  def __repr__(self):
+    return "Record(%s)" % self.as_dict()
+
+
+class phase:
+  """ Context manager that measures a phase. """
+  def __init__(self, name):
+    self.name = name
+    self.record = None
+
+  def __bool__(self):
+    """ False if nobody listens, so callers can skip counting. """
+    return bool(hooks)
+
+  def count(self, **counts):
+    """ Attaches object counts to the record. Values can be
+        callables, they are called only if measuring is on.
+    """
+    if self.record:
+      for k, v in counts.items():
+        self.record.counts[k] = v() if callable(v) else v
+
+  def __enter__(self):
+    if not hooks:
+      return self
+    if stack:  # keep peak of the outer phase before resetting it
+      outer = stack[-1].record
+      outer.peak = max(outer.peak, tracemalloc.get_traced_memory()[1])
+    tracemalloc.reset_peak()
+    self.record = Record(self.name, len(stack))
+    stack.append(self)
+    self.traced = tracemalloc.get_traced_memory()[0]
+    self.blocks = sys.getallocatedblocks()
+    self.cpu = process_time()
+    self.wall = perf_counter()
+    return self
+
+  def __exit__(self, *args):
+    if not self.record:
+      return
+    r = self.record
+    r.wall = perf_counter() - self.wall
+    r.cpu = process_time() - self.cpu
+    r.blocks = sys.getallocatedblocks() - self.blocks
+    traced, peak = tracemalloc.get_traced_memory()
+    r.alloc = traced - self.traced
+    r.peak = max(r.peak, peak) - self.traced
+    stack.pop()
+    if stack:
+      outer = stack[-1].record
+      outer.peak = max(outer.peak, peak)
+    for hook in hooks:
+      hook(r)
+
+
+###########
+# OUTPUTS #
+###########
+
+class JsonLines:
+  """ Writes every record as a json line. """
+  def __init__(self, file=sys.stderr):
+    self.file = file
+
+  def __call__(self, record):
+    import json
+    print(json.dumps(record.as_dict()), file=self.file)
+
+
+class Table:
+  """ Collects records and prints them as a table. """
+  def __init__(self):
+    self.records = []
+
+  def __call__(self, record):
+    self.records.append(record)
+
+  def print(self, file=sys.stderr):
+    counts = []
+    for r in self.records:
+      counts += [k for k in r.counts if k not in counts]
+    print("%-28s %10s %10s %10s %10s" % ("phase", "wall, ms", "cpu, ms", "blocks", "peak, KiB")
+          + "".join(" %8s" % k for k in counts), file=file)
+    for r in sorted(self.records, key=lambda r: r.seq):
+      print("%-28s %10.2f %10.2f %10d %10d" % ("  "*r.depth + r.name, r.wall*1000, r.cpu*1000, r.blocks, r.peak//1024)
+            + "".join(" %8s" % r.counts.get(k, '') for k in counts), file=file)
@@ -1,13 +1,13 @@
-from peg import RE, SOMEOF, MAYBE, OR, SYMBOL, NoMatch
+from peg import RE, SOMEOF, MAYBE, OR, SYMBOLS, NoMatch
 from ast import symap, Id, Match, Int, Str, ShellCmd, RegEx, Comment
 from log import Log
 
 log = Log("tokenizer")
 
 # CONSTANTS
-FLOATCONST = RE(r'\d+\.\d*')
+FLOATCONST = RE(r'\d+\.\d+')  # not \d+\.\d* to leave 1..10 to the range operator
 INTCONST   = RE(r'\d+', Int)
-STRCONST   = RE(r'"(.*)"', Str)
+STRCONST   = RE(r'"([^"]*)"', Str)
 SHELLCMD   = RE(r'`(.*)`', ShellCmd)
 REGEX      = RE(r'/(.*)/', RegEx)
 CONST = FLOATCONST | INTCONST | STRCONST | SHELLCMD | REGEX
@@ -27,13 +27,19 @@ END = EOL | (COMMENT+EOL)
 # IDENTIFIER (FUNCTION NAMES, VARIABLES, ETC)
 ID = RE(r'[A-Za-z_][a-zA-Z0-9_]*', Id)
 
-# put longest operators first because for PEG first match wins
-operators = []
-for sym in sorted(symap.keys(), key=len, reverse=True):
-  operators += [SYMBOL(sym, symap[sym])]
-OPERATOR = OR(*operators)
+# all operators as one regex, longest first because for PEG first match wins
+OPERATOR = SYMBOLS(symap)
 PROGRAM = SOMEOF(COMMENT, CONST, OPERATOR, ID) #+ END
 
+# the same grammar compiled by peggen.py, unless it is out of date
+try:
+  from tokenizer_peg import parse as parse_program, GRAMMAR
+  if GRAMMAR != repr(PROGRAM):
+    log.tokenizer("tokenizer_peg.py is stale, regenerate it with peggen.py")
+    parse_program = PROGRAM.parse
+except ImportError:
+  parse_program = PROGRAM.parse
+
 
 class DENT:
   def __init__(self, lvl):
@@ -52,23 +58,32 @@ def get_indent(s):
   return depth
 
 
+def tokenize_line(l, i):
+  """ Tokens of line number i, starting with its indentation. """
+  if not l:
+    return []
+  tokens = [DENT(get_indent(l))]
+  try:
+    ts, pos = parse_program(l)
+  except NoMatch:
+    raise Exception("cannot parse string:\n%s"%l)
+  if len(l) != pos:
+    if pos > 5: ptr = "here {}┘".format("─"*(pos-4))
+    else:       ptr = " "*(pos+1) + "└─── error is somewhere here"
+    msg = "{msg}:\n\"{text}\"\n{ptr}\n" \
+          .format(msg="Cannot parse line %s"%i, text=l, ptr=ptr)
+    raise Exception(msg)
+  for t in ts:
+    if not isinstance(t, str):  # AST leaves and operators
+      t.lineno = i
+  tokens += ts
+  return tokens
+
+
 def tokenize(raw):
   tokens = []
   for i,l in enumerate(raw.splitlines(), 1):
-    if not l:
-      continue
-    tokens += [DENT(get_indent(l))]
-    try:
-      ts, pos = PROGRAM.parse(l)
-    except NoMatch:
-      raise Exception("cannot parse string:\n%s"%l)
-    if len(l) != pos:
-      if pos > 5: ptr = "here {}┘".format("─"*(pos-4))
-      else:       ptr = " "*(pos+1) + "└─── error is somewhere here"
-      msg = "{msg}:\n\"{text}\"\n{ptr}\n" \
-            .format(msg="Cannot parse line %s"%i, text=l, ptr=ptr)
-      raise Exception(msg)
-    tokens += ts
+    tokens += tokenize_line(l, i)
 
   log("after tokenizer:\n", tokens)
-  return tokens
\ No newline at end of file
+  return tokens
@@ -0,0 +1,36 @@
+# Generated by peggen.py from tokenizer:PROGRAM, do not edit.
+# Regenerate with: ./peggen.py tokenizer:PROGRAM -o tokenizer_peg.py
+from peg import NoMatch
+import re
+
+from ast import Comment as _t0
+from ast import Int as _t2
+from ast import Str as _t3
+from ast import ShellCmd as _t4
+from ast import RegEx as _t5
+from pratt import symap
+from ast import Id as _t34
+_re0 = re.compile('(\\s*(\\#.*))|(\\s*(/\\*.*?\\*/))|(\\s*(//.*))|(\\s*(\\d+\\.\\d+))|(\\s*(\\d+))|(\\s*("([^"]*)"))|(\\s*(`(.*)`))|(\\s*(/(.*)/))|(\\s*assert)|(\\s*return)|(\\s*match)|(\\s*else)|(\\s*\\ \\.\\ )|(\\s*p\\ )|(\\s*\\->)|(\\s*=>)|(\\s*==)|(\\s*=\\~)|(\\s*\\.\\.)|(\\s*if)|(\\s*_)|(\\s*\\-)|(\\s*\\+)|(\\s*!)|(\\s*\\$)|(\\s*=)|(\\s*@)|(\\s*<)|(\\s*>)|(\\s*\\*)|(\\s*\\^)|(\\s*\\()|(\\s*\\))|(\\s*\\[)|(\\s*\\])|(\\s*,)|(\\s*([A-Za-z_][a-zA-Z0-9_]*))').match
+_tab0 = {1: (_t0, 2), 3: (_t0, 4), 5: (_t0, 6), 7: (str, 8), 9: (_t2, 10), 11: (_t3, 13), 14: (_t4, 16), 17: (_t5, 19), 20: (symap['assert'], None), 21: (symap['return'], None), 22: (symap['match'], None), 23: (symap['else'], None), 24: (symap[' . '], None), 25: (symap['p '], None), 26: (symap['->'], None), 27: (symap['=>'], None), 28: (symap['=='], None), 29: (symap['=~'], None), 30: (symap['..'], None), 31: (symap['if'], None), 32: (symap['_'], None), 33: (symap['-'], None), 34: (symap['+'], None), 35: (symap['!'], None), 36: (symap['$'], None), 37: (symap['='], None), 38: (symap['@'], None), 39: (symap['<'], None), 40: (symap['>'], None), 41: (symap['*'], None), 42: (symap['^'], None), 43: (symap['('], None), 44: (symap[')'], None), 45: (symap['['], None), 46: (symap[']'], None), 47: (symap[','], None), 48: (_t34, 49)}
+
+GRAMMAR = 'SOMEOF([OR([RE("\\#.*", <class \'ast.Comment\'>), RE("/\\*.*?\\*/", <class \'ast.Comment\'>), RE("//.*", <class \'ast.Comment\'>)]), OR([RE("\\d+\\.\\d+", <class \'str\'>), RE("\\d+", <class \'ast.Int\'>), RE(""([^"]*)"", <class \'ast.Str\'>), RE("`(.*)`", <class \'ast.ShellCmd\'>), RE("/(.*)/", <class \'ast.RegEx\'>)]), SYMBOLS([\'assert\', \'return\', \'match\', \'else\', \' . \', \'p \', \'->\', \'=>\', \'==\', \'=~\', \'..\', \'if\', \'_\', \'-\', \'+\', \'!\', \'$\', \'=\', \'@\', \'<\', \'>\', \'*\', \'^\', \'(\', \')\', \'[\', \']\', \',\']), RE("[A-Za-z_][a-zA-Z0-9_]*", <class \'ast.Id\'>)])'
+
+def _p0(text, pos):
+  result = []
+  while True:
+    m = _re0(text, pos)
+    if m:
+      tok, g = _tab0[m.lastindex]
+      pos = m.end()
+      result.append(tok(m.group(g)) if g else tok())
+      continue
+    break
+  if not result:
+    return None
+  return result, pos
+
+def parse(text, pos=0):
+  r = _p0(text, pos)
+  if r is None:
+    raise NoMatch("syntax error", text, pos)
+  return r
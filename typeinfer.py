@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""
+Hindley-Milner type inference.
+Types are unified with union-find over type variables, let-bound
+functions are generalized with levels (no scans of environment).
+"""
+
+from frame import Frame
+from ast import walk
+from log import Log
+log = Log("typeinfer")
+
+
+class InferenceError(Exception):
+  pass
+
+
+#########
+# TYPES #
+#########
+
+class TVar:
+  """ Type variable, a node in the union-find forest. """
+  def __init__(self, level):
+    self.ref = None   # what this variable was unified with
+    self.level = level
+
+  def find(self):
+    t = self
+    while isinstance(t, TVar) and t.ref is not None:
+      t = t.ref
+    # path compression
+    v = self
+    while isinstance(v, TVar) and v.ref is not None and v.ref is not t:
+      v.ref, v = t, v.ref
+    return t
+
+  def __repr__(self):
+    t = self.find()
+    if t is self:
+      return "t%x" % (id(self) & 0xfff)
+    return repr(t)
+
+
+class TCon:
+  """ Type constructor, e.g. Int, Array(Str), Func(Int, Int). """
+  def __init__(self, name, args=()):
+    self.name = name
+    self.args = tuple(args)
+
+  def __eq__(self, other):
+    return isinstance(other, TCon) and self.name == other.name \
+      and self.args == other.args
+
+  def __hash__(self):
+    return hash((self.name, self.args))
+
+  def __repr__(self):
+    if self.name == 'Func':
+      return "(%s) -> %s" % (", ".join(map(repr, self.args[:-1])), self.args[-1])
+    if self.args:
+      return "%s(%s)" % (self.name, ", ".join(map(repr, self.args)))
+    return self.name
+
+
+def TFunc(args, ret):
+  return TCon('Func', list(args) + [ret])
+
+
+def TArray(elem):
+  return TCon('Array', [elem])
+
+
+TInt   = TCon('Int')
+TStr   = TCon('Str')
+TBool  = TCon('Bool')
+TRegEx = TCon('RegEx')
+
+
+def resolve(t):
+  """ Substitutes all bound type variables. """
+  t = t.find() if isinstance(t, TVar) else t
+  if isinstance(t, TCon) and t.args:
+    return TCon(t.name, [resolve(a) for a in t.args])
+  return t
+
+
+def monomorphic(t):
+  """ True if the type does not contain free type variables. """
+  t = resolve(t)
+  if isinstance(t, TVar):
+    return False
+  return all(monomorphic(a) for a in t.args)
+
+
+class Scheme:
+  """ Type with universally quantified variables. """
+  def __init__(self, tvars, type):
+    self.tvars = tvars
+    self.type = type
+
+  def __repr__(self):
+    """ Canonical form, the same for alpha-equivalent schemes. """
+    names = {}
+    def show(t):
+      t = t.find() if isinstance(t, TVar) else t
+      if isinstance(t, TVar):
+        if id(t) not in names:
+          names[id(t)] = "'%s" % chr(ord('a') + len(names))
+        return names[id(t)]
+      if t.name == 'Func':
+        return "(%s) -> %s" % (", ".join(map(show, t.args[:-1])), show(t.args[-1]))
+      if t.args:
+        return "%s(%s)" % (t.name, ", ".join(map(show, t.args)))
+      return t.name
+    return show(self.type)
+
+
+###############
+# ENVIRONMENT #
+###############
+
+class TypeEnv(Frame):
+  """ Maps names to type schemes. Nested the same way as frames. """
+  def __init__(self, parent=None, checker=None):
+    super().__init__(parent)
+    self.checker = checker or parent.checker
+
+  def __enter__(self):
+    return TypeEnv(self)
+
+  def fresh(self):
+    return TVar(self.checker.level)
+
+  def unify(self, a, b, node=None):
+    try:
+      self.checker.unify(a, b)
+    except InferenceError as err:
+      raise InferenceError("%s in %s" % (err, node)) from None
+
+  def let(self, name, node):
+    """ Infers and generalizes a let-bound value (possibly recursive). """
+    checker = self.checker
+    checker.level += 1
+    t = self.fresh()
+    self[name] = Scheme([], t)
+    self.unify(t, node.infer_type(self), node)
+    checker.level -= 1
+    self[name] = checker.generalize(t)
+    return t
+
+  def instantiate(self, name):
+    try:
+      scheme = self[name]
+    except KeyError:
+      raise InferenceError("unknown variable \"%s\"" % name) from None
+    return self.checker.instantiate(scheme)
+
+
+###########
+# CHECKER #
+###########
+
+class Entry:
+  """ Cached result of checking one top-level definition. """
+  def __init__(self, fingerprint, deps, scheme):
+    self.fingerprint = fingerprint
+    self.deps = deps   # {name: repr of the scheme it was checked against}
+    self.scheme = scheme
+
+
+class Checker:
+  """
+  Infers types of top-level definitions in dependency order.
+  Inferred schemes are cached between calls of check(), a
+  definition is re-checked only if its text or the scheme of
+  one of its dependencies changed.
+  """
+  def __init__(self, builtins={}):
+    self.level = 0
+    self.builtins = builtins
+    self.cache = {}
+    self.checked = 0  # number of definitions actually inferred, for stats
+
+  def unify(self, a, b):
+    a = a.find() if isinstance(a, TVar) else a
+    b = b.find() if isinstance(b, TVar) else b
+    if a is b:
+      return
+    if isinstance(a, TVar):
+      self.bind(a, b)
+    elif isinstance(b, TVar):
+      self.bind(b, a)
+    elif a.name != b.name or len(a.args) != len(b.args):
+      raise InferenceError("cannot unify %s and %s" % (resolve(a), resolve(b)))
+    else:
+      for x, y in zip(a.args, b.args):
+        self.unify(x, y)
+
+  def bind(self, var, t):
+    """ Binds variable with occurs check and level adjustment. """
+    stack = [t]
+    while stack:
+      x = stack.pop()
+      x = x.find() if isinstance(x, TVar) else x
+      if x is var:
+        raise InferenceError("recursive type %s ~ %s" % (var, resolve(t)))
+      if isinstance(x, TVar):
+        x.level = min(x.level, var.level)
+      else:
+        stack.extend(x.args)
+    var.ref = t
+
+  def generalize(self, t):
+    tvars = []
+    stack = [t]
+    while stack:
+      x = stack.pop()
+      x = x.find() if isinstance(x, TVar) else x
+      if isinstance(x, TVar):
+        if x.level > self.level and x not in tvars:
+          tvars.append(x)
+      else:
+        stack.extend(x.args)
+    return Scheme(tvars, t)
+
+  def instantiate(self, scheme):
+    if not scheme.tvars:
+      return scheme.type
+    subst = {id(v): TVar(self.level) for v in scheme.tvars}
+    def inst(t):
+      t = t.find() if isinstance(t, TVar) else t
+      if isinstance(t, TVar):
+        return subst.get(id(t), t)
+      if not t.args:
+        return t
+      return TCon(t.name, [inst(a) for a in t.args])
+    return inst(scheme.type)
+
+  def check(self, program):
+    """ Checks a top-level block, returns environment with
+        the schemes of all top-level names.
+    """
+    env = TypeEnv(checker=self)
+    for name, t in self.builtins.items():
+      env[name] = t if isinstance(t, Scheme) else Scheme([], t)
+    env = TypeEnv(env)
+
+    defs = {}
+    for stmt in program:
+      name = definition(stmt)
+      if name:
+        defs[name] = stmt.right
+    deps = {name: sorted(n for n in names(node) if n in defs and n != name)
+            for name, node in defs.items()}
+    order, recursive = toposort(deps)
+    for name in recursive:
+      # recursive group, the name stays monomorphic until defined
+      env[name] = Scheme([], TVar(self.level))
+
+    for name in order:
+      node = defs[name]
+      fingerprint = repr(node)
+      depschemes = {dep: repr(env[dep]) for dep in deps[name]}
+      pre = env.dict.get(name)
+      entry = self.cache.get(name)
+      if entry and entry.fingerprint == fingerprint and entry.deps == depschemes:
+        log.cached(name, entry.scheme)
+        if pre is not None:
+          self.unify(pre.type, self.instantiate(entry.scheme))
+        env[name] = entry.scheme
+      else:
+        log.infer(name)
+        self.checked += 1
+        if pre is not None:
+          env.unify(pre.type, node.infer_type(env), node)
+        else:
+          env.let(name, node)
+        self.cache[name] = Entry(fingerprint, depschemes, env[name])
+
+    for stmt in program:
+      if not definition(stmt):
+        stmt.infer_type(env)
+    for name in list(self.cache):
+      if name not in defs:
+        del self.cache[name]
+    return env
+
+
+def toposort(deps):
+  """ Orders names so that dependencies go first. Also returns
+      names that are part of dependency cycles.
+  """
+  order, state, recursive = [], {}, set()
+  for root in deps:
+    if root in state:
+      continue
+    state[root] = 'active'
+    stack = [(root, iter(deps[root]))]
+    while stack:
+      name, it = stack[-1]
+      for dep in it:
+        if state.get(dep) == 'active':
+          recursive.add(dep)
+        elif dep not in state:
+          state[dep] = 'active'
+          stack.append((dep, iter(deps[dep])))
+          break
+      else:
+        stack.pop()
+        state[name] = 'done'
+        order.append(name)
+  return order, recursive
+
+
+def definition(stmt):
+  """ Name of the top-level definition or None. """
+  if type(stmt).__name__ == 'Assign' and type(stmt.left).__name__ == 'Var':
+    return stmt.left.value
+  return None
+
+
+def names(node):
+  """ Names referenced by a subtree. """
+  return {n.value for n in walk(node) if type(n).__name__ == 'Var'}